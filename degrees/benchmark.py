@@ -0,0 +1,265 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from collections import Counter
+
+import degrees
+from graph import StarGraph
+from landmarks import DEFAULT_LANDMARKS, LandmarkIndex
+
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael",
+    "Linda", "William", "Elizabeth", "David", "Barbara", "Richard", "Susan",
+    "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Daniel",
+    "Nancy", "Matthew", "Lisa", "Anthony", "Betty", "Mark", "Margaret",
+]
+
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+    "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez",
+    "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark",
+]
+
+# Search modes the benchmark can time, and the backend each one runs on
+MODES = {
+    "bfs": "dict",
+    "bidirectional": "dict",
+    "csr-bfs": "csr",
+    "csr-bidirectional": "csr",
+    "csr-astar": "csr",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="benchmark.py",
+        description="Generate synthetic star graphs and benchmark degrees searches."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generator = commands.add_parser("generate", help="write a synthetic dataset")
+    generator.add_argument("directory")
+    generator.add_argument("--people", type=int, default=1000000)
+    generator.add_argument("--movies", type=int, default=500000)
+    generator.add_argument("--cast", type=float, default=4.0,
+                           help="approximate mean number of stars per movie")
+    generator.add_argument("--exponent", type=float, default=0.8,
+                           help="Zipf exponent of how often each person is cast")
+    generator.add_argument("--seed", type=int, default=0)
+
+    runner = commands.add_parser("run", help="benchmark loading and searching")
+    runner.add_argument("directory")
+    runner.add_argument("--modes", default="bfs,bidirectional,csr-bfs,csr-bidirectional",
+                        help="comma-separated search modes: " + ", ".join(MODES))
+    runner.add_argument("--queries", type=int, default=100)
+    runner.add_argument("--pairs", choices=["random", "hubs"], default="random",
+                        help="query random people from the largest component, "
+                             "or the best-connected 1%%")
+    runner.add_argument("--landmarks", type=int, default=DEFAULT_LANDMARKS)
+    runner.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate(args.directory, args.people, args.movies, args.cast,
+                 args.exponent, args.seed)
+    else:
+        modes = args.modes.split(",")
+        unknown = [mode for mode in modes if mode not in MODES]
+        if unknown:
+            sys.exit(f"Unknown modes: {', '.join(unknown)}")
+        run(args.directory, modes, args.queries, args.pairs, args.landmarks, args.seed)
+
+
+def generate(directory, people, movies, cast=4.0, exponent=0.8, seed=0):
+    """
+    Writes people, movies and stars CSV files for a synthetic star graph
+    to `directory`.
+
+    How often each person is cast follows a Zipf law with the given
+    `exponent`, so a few hub actors appear in thousands of movies while
+    most people appear in one or two, as in the IMDb data.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, "people.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(["id", "name", "birth"])
+        for i in range(people):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            writer.writerow([i + 1, name, rng.randint(1900, 2010)])
+
+    with open(os.path.join(directory, "movies.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(["id", "title", "year"])
+        for i in range(movies):
+            writer.writerow([i + 1, f"Movie {i + 1}", rng.randint(1920, 2020)])
+
+    # Shuffle popularity ranks so hubs are spread across the id space
+    ranks = list(range(people))
+    rng.shuffle(ranks)
+    weights = list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in ranks))
+
+    with open(os.path.join(directory, "stars.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["person_id", "movie_id"])
+        for movie_id in range(1, movies + 1):
+            size = 1 + int(rng.expovariate(1 / (cast - 1))) if cast > 1 else 1
+            for person in set(rng.choices(range(people), cum_weights=weights, k=size)):
+                writer.writerow([person + 1, movie_id])
+
+
+def run(directory, modes, queries=100, pairs="random", landmarks=DEFAULT_LANDMARKS, seed=0):
+    """
+    Loads `directory` into every backend the `modes` need, then times
+    `queries` searches in each mode and prints a report.
+    """
+    backends = {MODES[mode] for mode in modes}
+    rows = []
+
+    # Each step is measured in a child process, then repeated here to
+    # keep its result for the searches
+    if "dict" in backends:
+        rows.append(("load dict", *measure(degrees.load_data, directory)))
+        degrees.load_data(directory)
+    graph = None
+    if "csr" in backends:
+        rows.append(("load csr", *measure(StarGraph.load, directory)))
+        graph = StarGraph.load(directory)
+        if "csr-astar" in modes:
+            rows.append(("load landmarks", *measure(
+                LandmarkIndex.load, graph, directory, landmarks
+            )))
+            graph.landmarks = LandmarkIndex.load(graph, directory, landmarks)
+
+    print(f"{'step':<20} {'seconds':>10} {'peak MiB':>10}")
+    for step, elapsed, peak in rows:
+        print(f"{step:<20} {elapsed:>10.3f} {peak / 2 ** 20:>10.1f}")
+    print()
+
+    queries = choose_pairs(directory, queries, pairs, seed)
+    print(f"{'mode':<20} {'p50 ms':>10} {'p99 ms':>10} {'explored':>10} "
+          f"{'found':>8} {'no path':>8}")
+    for mode in modes:
+        if MODES[mode] == "dict":
+            search = degrees.SEARCHES[mode]
+            explored = lambda: degrees.num_explored
+        else:
+            search = graph.searches()[mode[len("csr-"):]]
+            explored = lambda: graph.num_explored
+
+        # Searches between disconnected people return almost at once, so
+        # only those that found a path count towards the latencies
+        latencies = []
+        nodes = 0
+        for source, target in queries:
+            start = time.perf_counter()
+            path = search(source, target)
+            elapsed = time.perf_counter() - start
+            if path is not None:
+                latencies.append(elapsed)
+                nodes += explored()
+
+        latencies.sort()
+        found = len(latencies)
+        if found:
+            print(f"{mode:<20} {1000 * percentile(latencies, 50):>10.2f} "
+                  f"{1000 * percentile(latencies, 99):>10.2f} "
+                  f"{nodes / found:>10.0f} {found:>8} {len(queries) - found:>8}")
+        else:
+            print(f"{mode:<20} {'-':>10} {'-':>10} {'-':>10} {0:>8} {len(queries):>8}")
+
+
+def measure(function, *args):
+    """
+    Calls `function(*args)` in a forked child process, returning the
+    seconds it took and the peak memory it added in bytes.
+
+    The peak is the growth of the child's maximum resident set size, so
+    neither earlier steps nor the overhead of tracing allocations skew
+    the measurements.
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=measured_call, args=(sender, function, args))
+    child.start()
+    sender.close()
+    elapsed, peak = receiver.recv()
+    child.join()
+    return elapsed, peak
+
+
+def measured_call(sender, function, args):
+    """
+    Calls `function(*args)` and sends the seconds it took and the growth
+    of this process's maximum resident set size, in bytes, to `sender`.
+    """
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports the resident set size in KiB, macOS in bytes
+    unit = 1 if sys.platform == "darwin" else 1024
+    sender.send((elapsed, (after - before) * unit))
+
+
+def choose_pairs(directory, n, kind="random", seed=0):
+    """
+    Returns `n` (source, target) pairs of person ids from `directory`,
+    drawn from the people in the largest connected component or, for
+    "hubs", from the best-connected 1% of people.
+
+    Most people in a dataset may never have starred in anything, and
+    pairs of them would only time how quickly a search gives up.
+    """
+    rng = random.Random(seed)
+    with open(os.path.join(directory, "stars.csv"), encoding="utf-8") as f:
+        stars = [(row["person_id"], row["movie_id"]) for row in csv.DictReader(f)]
+    if kind == "hubs":
+        counts = Counter(person_id for person_id, _ in stars)
+        people = [person_id for person_id, _ in counts.most_common(max(2, len(counts) // 100))]
+        return [(rng.choice(people), rng.choice(people)) for _ in range(n)]
+
+    # Union each person with the first star of each of their movies
+    parent = {}
+
+    def find(p):
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    first_star = {}
+    for person_id, movie_id in stars:
+        parent.setdefault(person_id, person_id)
+        other = first_star.setdefault(movie_id, person_id)
+        parent[find(person_id)] = find(other)
+
+    components = Counter(find(p) for p in parent)
+    if not components:
+        sys.exit("No stars to choose people from")
+    largest = components.most_common(1)[0][0]
+    people = sorted(p for p in parent if find(p) == largest)
+    return [(rng.choice(people), rng.choice(people)) for _ in range(n)]
+
+
+def percentile(values, q):
+    """
+    Returns the `q`th percentile of the sorted list `values`,
+    by the nearest-rank method.
+    """
+    rank = max(1, -(-q * len(values) // 100))
+    return values[int(rank) - 1]
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
+import argparse
 import csv
+import heapq
 import sys
 
-from util import Node, StackFrontier, QueueFrontier
+from graph import StarGraph, read_delta
+from landmarks import DEFAULT_LANDMARKS, LandmarkIndex
+from nameindex import NameIndex
+from util import DisjointSet, Node, StackFrontier, QueueFrontier
 
 # Maps names to a set of corresponding person_ids
 names = {}
@@ -12,6 +17,19 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# Groups person_ids into connected components of the star graph
+components = DisjointSet()
+
+# Number of people expanded by the most recent search
+num_explored = 0
+
+# NameIndex over the keys of `names`, built on first use
+name_index = None
+
+# Integer-indexed CSR graph, used instead of the dictionaries above
+# when degrees.py is run with --csr
+graph = None
+
 
 def load_data(directory):
     """
@@ -19,47 +37,119 @@ def load_data(directory):
     """
     # Load people
     with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
-            else:
-                names[row["name"].lower()].add(row["id"])
+        add_people(csv.DictReader(f))
 
     # Load movies
     with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
+        add_movies(csv.DictReader(f))
 
     # Load stars
     with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
-            except KeyError:
-                pass
+        add_stars(csv.DictReader(f))
+
+
+def apply_delta(directory):
+    """
+    Applies the people, movies and stars in the CSV files of `directory`
+    on top of the data already loaded, in time proportional to the
+    number of new rows. Any of the three files may be missing.
+
+    With either backend the rows only apply to this run: they are not
+    recorded in the CSR snapshot's journal, which holds deltas sent to
+    the server for every later load.
+    """
+    rows = read_delta(directory)
+    if graph is not None:
+        graph.apply_delta(rows["people"], rows["movies"], rows["stars"], record=False)
+    else:
+        add_people(rows["people"])
+        add_movies(rows["movies"])
+        add_stars(rows["stars"])
+
+
+def add_people(rows):
+    """
+    Adds people rows to `people` and `names`, keeping the movies
+    of anyone already loaded.
+    """
+    for row in rows:
+        person = people.setdefault(row["id"], {"movies": set()})
+        person["name"] = row["name"]
+        person["birth"] = row["birth"]
+        if row["name"].lower() not in names:
+            names[row["name"].lower()] = {row["id"]}
+            if name_index is not None:
+                name_index.add(row["name"])
+        else:
+            names[row["name"].lower()].add(row["id"])
+
+
+def add_movies(rows):
+    """
+    Adds movie rows to `movies`, keeping the stars
+    of any movie already loaded.
+    """
+    for row in rows:
+        movie = movies.setdefault(row["id"], {"stars": set()})
+        movie["title"] = row["title"]
+        movie["year"] = row["year"]
+
+
+def add_stars(rows):
+    """
+    Links people to the movies they starred in, skipping rows that refer
+    to unknown people or movies, and merges their components.
+    """
+    for row in rows:
+        try:
+            person = people[row["person_id"]]
+            stars = movies[row["movie_id"]]["stars"]
+        except KeyError:
+            continue
+
+        # Everyone in a movie shares a component, so joining any one
+        # existing star is enough
+        costar_id = next(iter(stars), None)
+        if costar_id is not None:
+            components.union(row["person_id"], costar_id)
+        person["movies"].add(row["movie_id"])
+        stars.add(row["person_id"])
 
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(prog="degrees.py")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--search", choices=sorted(SEARCHES) + ["astar"], default="bfs",
+                        help="search strategy used to find the shortest path; "
+                             "bidirectional is the fastest, while astar, which "
+                             "requires --csr, is slower on hub-heavy graphs "
+                             "because it ranks every co-star it reaches")
+    parser.add_argument("--csr", action="store_true",
+                        help="load the data into a compact integer-indexed graph, "
+                             "cached as a memory-mapped snapshot along with the "
+                             "index behind name suggestions, which is otherwise "
+                             "built on first use")
+    parser.add_argument("--landmarks", type=int, default=DEFAULT_LANDMARKS,
+                        help="number of landmarks indexed for astar search")
+    parser.add_argument("--delta", action="append", default=[], metavar="DIRECTORY",
+                        help="apply the CSV files in DIRECTORY after loading, for this "
+                             "run only; repeatable")
+    args = parser.parse_args()
+    if args.search == "astar" and not args.csr:
+        parser.error("--search astar requires --csr")
+    directory = args.directory
 
     # Load data from files into memory
+    global graph
     print("Loading data...")
-    load_data(directory)
+    if args.csr:
+        graph = StarGraph.load(directory)
+        if args.search == "astar":
+            graph.landmarks = LandmarkIndex.load(graph, directory, args.landmarks)
+    else:
+        load_data(directory)
+    for delta in args.delta:
+        apply_delta(delta)
     print("Data loaded.")
 
     source = person_id_for_name(input("Name: "))
@@ -69,7 +159,8 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    searches = graph.searches() if graph is not None else SEARCHES
+    path = searches[args.search](source, target)
 
     if path is None:
         print("Not connected.")
@@ -78,9 +169,9 @@ def main():
         print("{degrees} degrees of separation.".format(degrees=degrees))
         path = [(None, source)] + path
         for i in range(degrees):
-            person1 = people[path[i][1]]["name"]
-            person2 = people[path[i + 1][1]]["name"]
-            movie = movies[path[i + 1][0]]["title"]
+            person1 = person_for_id(path[i][1])["name"]
+            person2 = person_for_id(path[i + 1][1])["name"]
+            movie = movie_for_id(path[i + 1][0])["title"]
             k = i + 1
             print("{k}: {person1} and {person2} starred in {movie}".format(k=k, person1=person1, person2=person2, movie=movie))
 
@@ -92,16 +183,23 @@ def shortest_path(source, target):
 
     If no possible path, returns None.
     """
-
+    global num_explored
     num_explored = 0
 
+    if source == target:
+        return []
+
+    # People in different components can never be connected
+    if not components.connected(source, target):
+        return None
+
     # Initialize the frontier to just the starting position
     start = Node(state=source, parent=None, action=None)
     frontier = QueueFrontier()
     frontier.add(start)
 
     explored = set()
-    realSolution = list()
+    seen_movies = set()
 
     while True:
 
@@ -113,28 +211,241 @@ def shortest_path(source, target):
         node = frontier.remove()
         num_explored += 1
 
-        # If node is the goal, then we have a solution
-        if node.state == target:
-            actions = []
-            cells = []
-            while node.parent is not None:
+        explored.add(node.state)
+        for action, state in iter_neighbors(node.state, seen_movies):
+
+            if frontier.contains_state(state) or state in explored:
+                continue
+            child = Node(state=state, parent=node, action=action)
+
+            # Test for the goal as soon as it is generated, which saves
+            # expanding the rest of the current layer
+            if state == target:
+                return solution(child)
+            frontier.add(child)
+
+
+def solution(node):
+    """
+    Returns the (movie_id, person_id) pairs on the path from the
+    root of the search tree to `node`.
+    """
+    path = []
+    while node.parent is not None:
+        path.append((node.action, node.state))
+        node = node.parent
+    path.reverse()
+    return path
+
+
+def bidirectional_shortest_path(source, target):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, searching outward from
+    both ends at once and stopping where the two searches meet.
+
+    If no possible path, returns None.
+    """
+    global num_explored
+    num_explored = 0
+
+    if source == target:
+        return []
+    if not components.connected(source, target):
+        return None
+
+    # Each side maps a person to the (movie_id, person_id) step that
+    # reached them, pointing back towards that side's starting person
+    forward = {source: None}
+    backward = {target: None}
+    forward_layer = [source]
+    backward_layer = [target]
+    forward_movies = set()
+    backward_movies = set()
+
+    while forward_layer and backward_layer:
+
+        # Always grow the smaller layer, keeping both searches shallow
+        if len(forward_layer) <= len(backward_layer):
+            forward_layer, meeting = expand_layer(
+                forward_layer, forward, backward, forward_movies
+            )
+        else:
+            backward_layer, meeting = expand_layer(
+                backward_layer, backward, forward, backward_movies
+            )
+
+        if meeting is not None:
+            return join_paths(meeting, forward, backward)
 
-                actions.append(node.action)
-                cells.append(node.state)
+    return None
+
+
+def expand_layer(layer, visited, other, seen_movies):
+    """
+    Expands every person in `layer` by one step, recording how each new
+    person was reached in `visited` and which movies were expanded in
+    `seen_movies`.
+
+    Returns the next layer and the first person also seen by the `other`
+    search, or None if the searches have not met yet.
+    """
+    global num_explored
+    next_layer = []
+    for person_id in layer:
+        num_explored += 1
+        for movie_id, neighbor_id in iter_neighbors(person_id, seen_movies):
+            if neighbor_id in visited:
+                continue
+            visited[neighbor_id] = (movie_id, person_id)
+            if neighbor_id in other:
+                return next_layer, neighbor_id
+            next_layer.append(neighbor_id)
+    return next_layer, None
+
+
+def join_paths(meeting, forward, backward):
+    """
+    Rebuilds the (movie_id, person_id) path through `meeting` from the
+    parent links left behind by both halves of a bidirectional search.
+    """
+    path = []
+    person_id = meeting
+    while forward[person_id] is not None:
+        movie_id, parent_id = forward[person_id]
+        path.append((movie_id, person_id))
+        person_id = parent_id
+    path.reverse()
+
+    person_id = meeting
+    while backward[person_id] is not None:
+        movie_id, child_id = backward[person_id]
+        path.append((movie_id, child_id))
+        person_id = child_id
+    return path
+
+
+def all_shortest_paths(source, target):
+    """
+    Yields every shortest list of (movie_id, person_id) pairs
+    that connect the source to the target.
+
+    A breadth-first search records, for each person, every
+    (movie_id, person_id) step that reaches them from the previous layer,
+    stopping once the target's layer is complete. Paths are then read off
+    that DAG lazily, one at a time.
+    """
+    if source == target:
+        yield []
+        return
+    if not components.connected(source, target):
+        return
+
+    parents = {source: []}
+    layer = [source]
+    while layer and target not in parents:
+        next_parents = {}
+        for person_id in layer:
+            for movie_id, neighbor_id in iter_neighbors(person_id):
+                if neighbor_id in parents:
+                    continue
+                next_parents.setdefault(neighbor_id, []).append((movie_id, person_id))
+        parents.update(next_parents)
+        layer = list(next_parents)
+
+    if target not in parents:
+        return
+
+    # Walk back from the target; each node's parent is the rest of the path
+    # towards the target, so reaching the source completes a path
+    stack = [Node(state=target, parent=None, action=None)]
+    while stack:
+        node = stack.pop()
+        if node.state == source:
+            path = []
+            while node.parent is not None:
+                path.append((node.action, node.parent.state))
                 node = node.parent
-            actions.reverse()
-            cells.reverse()
-            for i in range(len(actions)):
-                realSolution.append((actions[i], cells[i]))
-            return realSolution
+            yield path
+            continue
+        for movie_id, parent_id in reversed(parents[node.state]):
+            stack.append(Node(state=parent_id, parent=node, action=movie_id))
 
-        explored.add(node.state)
-        for action, state in neighbors_for_person(node.state):
 
-            if not frontier.contains_state(state) and state not in explored:
-                child = Node(state=state, parent=node, action=action)
-                frontier.add(child)
+def k_shortest_paths(source, target, k=None):
+    """
+    Yields up to `k` loopless lists of (movie_id, person_id) pairs that
+    connect the source to the target, shortest first, or every such path
+    if `k` is None.
+
+    Uses Yen's algorithm: each new path branches off a previous one at a
+    "spur" person, with the edges already taken from that same prefix and
+    the people earlier on it excluded from the search.
+    """
+    path = restricted_path(source, target, set(), set())
+    if path is None:
+        return
+
+    accepted = []
+    candidates = []
+    seen = {tuple(path)}
+    count = 0
+    while path is not None and (k is None or len(accepted) < k):
+        accepted.append(path)
+        yield path
+
+        people_on_path = [source] + [person_id for _, person_id in path]
+        for i in range(len(path)):
+            spur_id = people_on_path[i]
+            root = path[:i]
+
+            # Remove the next step of every accepted path sharing this root
+            removed_edges = set()
+            for other in accepted:
+                if other[:i] == root and len(other) > i:
+                    removed_edges.add((spur_id, other[i]))
+            removed_people = set(people_on_path[:i])
+
+            spur = restricted_path(spur_id, target, removed_people, removed_edges)
+            if spur is None:
+                continue
+            candidate = root + spur
+            if tuple(candidate) not in seen:
+                seen.add(tuple(candidate))
+                heapq.heappush(candidates, (len(candidate), count, candidate))
+                count += 1
+
+        path = heapq.heappop(candidates)[2] if candidates else None
+
+
+def restricted_path(source, target, removed_people, removed_edges):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs from source
+    to target that avoids every person in `removed_people` and every
+    (person_id, (movie_id, person_id)) step in `removed_edges`.
+
+    If no possible path, returns None.
+    """
+    if source == target:
+        return []
+
+    frontier = QueueFrontier()
+    frontier.add(Node(state=source, parent=None, action=None))
+    explored = set(removed_people)
 
+    while not frontier.empty():
+        node = frontier.remove()
+        explored.add(node.state)
+        for action, state in iter_neighbors(node.state):
+            if state in explored or frontier.contains_state(state):
+                continue
+            if (node.state, (action, state)) in removed_edges:
+                continue
+            child = Node(state=state, parent=node, action=action)
+            if state == target:
+                return solution(child)
+            frontier.add(child)
+    return None
 
 
 def person_id_for_name(name):
@@ -142,13 +453,19 @@ def person_id_for_name(name):
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
     """
-    person_ids = list(names.get(name.lower(), set()))
+    if graph is not None:
+        person_ids = graph.person_ids_for_name(name)
+    else:
+        person_ids = list(names.get(name.lower(), set()))
     if len(person_ids) == 0:
+        suggestions = suggest_names(name)
+        if suggestions:
+            print("Did you mean: {names}?".format(names=", ".join(suggestions)))
         return None
     elif len(person_ids) > 1:
         print("Which '{name}'?".format(name=name))
         for person_id in person_ids:
-            person = people[person_id]
+            person = person_for_id(person_id)
             name = person["name"]
             birth = person["birth"]
             print("ID: {person_id}, Name: {name}, Birth: {birth}".format(person_id=person_id, name=name, birth=birth))
@@ -163,6 +480,49 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+def suggest_names(name, limit=5):
+    """
+    Returns up to `limit` names of people whose names start with,
+    or closely resemble, a partial or misspelled `name`.
+    """
+    global name_index
+    if graph is not None:
+        index = graph.name_index()
+        lookup = graph.person_ids_for_name
+    else:
+        # Without a snapshot to load it from, the index is built on the
+        # first suggestion, which takes seconds for millions of names
+        if name_index is None:
+            name_index = NameIndex(sorted(names))
+        index = name_index
+        lookup = names.get
+
+    return [
+        person_for_id(next(iter(lookup(key))))["name"]
+        for key in index.suggest(name, limit)
+    ]
+
+
+def person_for_id(person_id):
+    """
+    Returns the name and birth year of a person from whichever
+    store the data was loaded into.
+    """
+    if graph is not None:
+        return graph.person(person_id)
+    return people[person_id]
+
+
+def movie_for_id(movie_id):
+    """
+    Returns the title and year of a movie from whichever
+    store the data was loaded into.
+    """
+    if graph is not None:
+        return graph.movie(movie_id)
+    return movies[movie_id]
+
+
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
@@ -176,5 +536,31 @@ def neighbors_for_person(person_id):
     return neighbors
 
 
+def iter_neighbors(person_id, seen_movies=None):
+    """
+    Yields (movie_id, person_id) pairs for people who starred with a
+    given person, without building a set of them first.
+
+    If `seen_movies` is given, movies already in it are skipped and
+    every movie expanded is added to it. A search can pass the same set
+    for every person it expands, since a movie's stars have all been
+    generated once any of them has been expanded.
+    """
+    for movie_id in people[person_id]["movies"]:
+        if seen_movies is not None:
+            if movie_id in seen_movies:
+                continue
+            seen_movies.add(movie_id)
+        for star_id in movies[movie_id]["stars"]:
+            yield movie_id, star_id
+
+
+# Search strategies selectable from the command line
+SEARCHES = {
+    "bfs": shortest_path,
+    "bidirectional": bidirectional_shortest_path,
+}
+
+
 if __name__ == "__main__":
     main()
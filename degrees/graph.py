@@ -0,0 +1,686 @@
+import csv
+import json
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+
+import snapshot
+from nameindex import NameIndex, Postings, SortedView
+from snapshot import StringTable
+from util import DisjointSet
+
+# Name of the snapshot file written next to a dataset's CSV files
+SNAPSHOT = "graph.snapshot"
+
+# Name of the journal of deltas applied on top of the snapshot
+JOURNAL = "graph.journal"
+
+
+class StarGraph():
+    """
+    Compact star graph in which every person and movie is interned to a
+    dense integer index.
+
+    Edges are stored in compressed sparse row (CSR) form: the movies of
+    person `p` are `person_movies[person_offsets[p]:person_offsets[p + 1]]`
+    and the stars of movie `m` are
+    `movie_people[movie_offsets[m]:movie_offsets[m + 1]]`.
+    """
+
+    # Arrays that make up a graph, in the order they are stored in a snapshot
+    SECTIONS = (
+        "person_ids", "person_names", "person_births",
+        "movie_ids", "movie_titles", "movie_years",
+        "person_offsets", "person_movies", "movie_offsets", "movie_people",
+        "person_order", "movie_order", "name_order", "person_components",
+        "gram_keys", "gram_offsets", "gram_positions",
+    )
+
+    def __init__(self, person_ids, person_names, person_births,
+                 movie_ids, movie_titles, movie_years,
+                 person_offsets, person_movies, movie_offsets, movie_people,
+                 person_order=None, movie_order=None, name_order=None,
+                 person_components=None, gram_keys=None, gram_offsets=None,
+                 gram_positions=None):
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.person_births = person_births
+        self.movie_ids = movie_ids
+        self.movie_titles = movie_titles
+        self.movie_years = movie_years
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_people = movie_people
+
+        # Lookups go through index arrays sorted by key rather than
+        # dictionaries, so a memory-mapped graph is usable without
+        # touching every row
+        if person_order is None:
+            person_order = sorted_order(person_ids)
+        if movie_order is None:
+            movie_order = sorted_order(movie_ids)
+        if name_order is None:
+            name_order = sorted_order(person_names, str.lower)
+        self.person_order = person_order
+        self.movie_order = movie_order
+        self.name_order = name_order
+
+        # Component label of every person, so disconnected pairs are
+        # rejected without searching
+        if person_components is None:
+            person_components = label_components(
+                len(person_offsets) - 1, movie_offsets, movie_people
+            )
+        self.person_components = person_components
+
+        # Postings of the n-grams of every lowercased name, by position in
+        # `name_order`, so fuzzy lookup needs no index built at run time
+        if gram_keys is None:
+            postings = Postings.from_names(
+                SortedView(person_names, name_order, str.lower)
+            )
+            gram_keys, gram_offsets, gram_positions = (
+                postings.keys, postings.offsets, postings.positions
+            )
+        self.gram_keys = gram_keys
+        self.gram_offsets = gram_offsets
+        self.gram_positions = gram_positions
+
+        # Optional LandmarkIndex enabling A* search
+        self.landmarks = None
+
+        # Number of people expanded by the most recent search
+        self.num_explored = 0
+
+        # NameIndex for partial and fuzzy name lookup, built on first use
+        self.names = None
+
+        # Rows applied by apply_delta live alongside the arrays above:
+        # new people and movies are indexed by id and lowercased name,
+        # new edges are kept per person and per movie, and components
+        # joined by new edges are merged by label
+        self.added_people = {}
+        self.added_movies = {}
+        self.added_names = {}
+        self.extra_movies = {}
+        self.extra_stars = {}
+        self.merged = DisjointSet()
+
+        # Journal file shared with other processes using the same snapshot,
+        # how much of it has been applied to this graph, and the stamp of
+        # the CSV files the graph was loaded from
+        self.journal = None
+        self.journal_position = 0
+        self.stamp = None
+
+    @classmethod
+    def from_directory(cls, directory):
+        """
+        Build a graph from the people, movies and stars CSV files
+        in `directory`.
+        """
+        person_ids, person_names, person_births = [], [], []
+        with open(f"{directory}/people.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                person_ids.append(row["id"])
+                person_names.append(row["name"])
+                person_births.append(row["birth"])
+
+        movie_ids, movie_titles, movie_years = [], [], []
+        with open(f"{directory}/movies.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                movie_ids.append(row["id"])
+                movie_titles.append(row["title"])
+                movie_years.append(row["year"])
+
+        # Collect edges as two parallel integer arrays, skipping rows
+        # that refer to unknown people or movies
+        person_index = {person_id: i for i, person_id in enumerate(person_ids)}
+        movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+        edge_people = array("i")
+        edge_movies = array("i")
+        with open(f"{directory}/stars.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                p = person_index.get(row["person_id"])
+                m = movie_index.get(row["movie_id"])
+                if p is None or m is None:
+                    continue
+                edge_people.append(p)
+                edge_movies.append(m)
+
+        person_offsets, person_movies = build_csr(
+            len(person_ids), edge_people, edge_movies
+        )
+        movie_offsets, movie_people = build_csr(
+            len(movie_ids), edge_movies, edge_people
+        )
+        return cls(
+            StringTable.from_strings(person_ids),
+            StringTable.from_strings(person_names),
+            StringTable.from_strings(person_births),
+            StringTable.from_strings(movie_ids),
+            StringTable.from_strings(movie_titles),
+            StringTable.from_strings(movie_years),
+            person_offsets, person_movies, movie_offsets, movie_people
+        )
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Returns the graph for `directory`, memory-mapping its snapshot
+        when one is present and up to date, and otherwise building the
+        graph from the CSV files and writing a fresh snapshot. Either way,
+        deltas journaled against the same CSV files are applied on top.
+        """
+        path = os.path.join(directory, SNAPSHOT)
+        fingerprint = dataset_stamp(directory)
+        journal = os.path.join(directory, JOURNAL)
+        sections = snapshot.read(path, fingerprint)
+
+        # Snapshots written before a section was added are rebuilt
+        if sections is not None and all(name in sections for name in cls.SECTIONS):
+            graph = cls(**sections)
+            graph.journal = journal
+            graph.stamp = fingerprint
+            graph.refresh()
+            return graph
+
+        graph = cls.from_directory(directory)
+        graph.stamp = fingerprint
+        try:
+            graph.save(path, fingerprint)
+        except OSError:
+            return graph
+
+        # Deltas journaled against the same CSV files still apply to the
+        # rebuilt graph, but those recorded against older files do not;
+        # journals from before stamps were recorded are kept only if they
+        # sat next to a snapshot of these files
+        stamp = journal_stamp(journal)
+        if stamp != fingerprint and (stamp is not None or sections is None):
+            try:
+                os.remove(journal)
+            except FileNotFoundError:
+                pass
+        graph.journal = journal
+        graph.refresh()
+        return graph
+
+    def save(self, path, fingerprint):
+        """
+        Writes the graph to a snapshot file at `path`.
+        """
+        snapshot.write(
+            path, {name: getattr(self, name) for name in self.SECTIONS}, fingerprint
+        )
+
+    def person_index(self, person_id):
+        """
+        Returns the index of the person with IMDB id `person_id`.
+        """
+        found = equal_range(self.person_order, self.person_ids.__getitem__, person_id)
+        if found:
+            return found[0]
+        return self.added_people[person_id]
+
+    def movie_index(self, movie_id):
+        """
+        Returns the index of the movie with IMDB id `movie_id`.
+        """
+        found = equal_range(self.movie_order, self.movie_ids.__getitem__, movie_id)
+        if found:
+            return found[0]
+        return self.added_movies[movie_id]
+
+    def person_ids_for_name(self, name):
+        """
+        Returns the IMDB ids of every person called `name`.
+        """
+        found = equal_range(
+            self.name_order, lambda i: self.person_names[i].lower(), name.lower()
+        )
+        found = list(found) + self.added_names.get(name.lower(), [])
+        return [self.person_ids[i] for i in found]
+
+    def name_index(self):
+        """
+        Returns a NameIndex over every person's lowercased name.
+        """
+        if self.names is None:
+            self.names = NameIndex(
+                SortedView(self.person_names, self.name_order, str.lower),
+                Postings(self.gram_keys, self.gram_offsets, self.gram_positions),
+            )
+            for name in self.added_names:
+                self.names.add(name)
+        return self.names
+
+    def person(self, person_id):
+        """
+        Returns the name and birth year of a person.
+        """
+        i = self.person_index(person_id)
+        return {"name": self.person_names[i], "birth": self.person_births[i]}
+
+    def movie(self, movie_id):
+        """
+        Returns the title and year of a movie.
+        """
+        i = self.movie_index(movie_id)
+        return {"title": self.movie_titles[i], "year": self.movie_years[i]}
+
+    def connected(self, p, q):
+        """
+        Returns whether person indices `p` and `q` are in the
+        same connected component.
+        """
+        return self.component(p) == self.component(q)
+
+    def component(self, p):
+        """
+        Returns the component label of person index `p`.
+        """
+        if p < len(self.person_components):
+            label = self.person_components[p]
+        else:
+            label = p
+        return self.merged.find(label)
+
+    def neighbors(self, p):
+        """
+        Yields (movie, person) index pairs for people
+        who starred with person index `p`.
+        """
+        if self.extra_movies or self.extra_stars:
+            for m in self.movies_of(p):
+                for q in self.stars_of(m):
+                    yield m, q
+            return
+
+        person_movies, movie_offsets = self.person_movies, self.movie_offsets
+        movie_people = self.movie_people
+        for j in range(self.person_offsets[p], self.person_offsets[p + 1]):
+            m = person_movies[j]
+            for k in range(movie_offsets[m], movie_offsets[m + 1]):
+                yield m, movie_people[k]
+
+    def movies_of(self, p):
+        """
+        Returns the movie indices person index `p` starred in.
+        """
+        movies = []
+        if p < len(self.person_offsets) - 1:
+            movies.extend(
+                self.person_movies[self.person_offsets[p]:self.person_offsets[p + 1]]
+            )
+        movies.extend(self.extra_movies.get(p, ()))
+        return movies
+
+    def stars_of(self, m):
+        """
+        Returns the person indices who starred in movie index `m`.
+        """
+        stars = []
+        if m < len(self.movie_offsets) - 1:
+            stars.extend(
+                self.movie_people[self.movie_offsets[m]:self.movie_offsets[m + 1]]
+            )
+        stars.extend(self.extra_stars.get(m, ()))
+        return stars
+
+    def apply_delta(self, people=(), movies=(), stars=(), record=True):
+        """
+        Applies new people, movies and stars rows, as read from CSV files,
+        in time proportional to the number of rows.
+
+        People and movies already in the graph are left unchanged, and
+        star rows that refer to unknown people or movies are skipped.
+        Unless `record` is False, the rows are also appended to the
+        journal so other processes sharing the snapshot pick them up.
+        """
+        if record and self.journal is not None:
+            self.refresh()
+            entry = json.dumps({"people": people, "movies": movies, "stars": stars})
+            with open(self.journal, "a", encoding="utf-8") as f:
+                # A new journal starts with the stamp of the CSV files
+                # its deltas apply to
+                if f.tell() == 0:
+                    f.write(json.dumps({"stamp": self.stamp}) + "\n")
+                f.write(entry + "\n")
+                self.journal_position = f.tell()
+
+        for row in people:
+            if self.find(self.person_index, row["id"]) is not None:
+                continue
+            p = len(self.person_ids)
+            self.added_people[row["id"]] = p
+            self.added_names.setdefault(row["name"].lower(), []).append(p)
+            self.extend("person_ids", row["id"])
+            self.extend("person_names", row["name"])
+            self.extend("person_births", row["birth"])
+            if self.names is not None:
+                self.names.add(row["name"])
+
+        for row in movies:
+            if self.find(self.movie_index, row["id"]) is not None:
+                continue
+            self.added_movies[row["id"]] = len(self.movie_ids)
+            self.extend("movie_ids", row["id"])
+            self.extend("movie_titles", row["title"])
+            self.extend("movie_years", row["year"])
+
+        touched = set()
+        for row in stars:
+            p = self.find(self.person_index, row["person_id"])
+            m = self.find(self.movie_index, row["movie_id"])
+            if p is None or m is None or m in self.movies_of(p):
+                continue
+
+            # Everyone in a movie shares a component, so joining any one
+            # existing star is enough
+            costars = self.stars_of(m)
+            if costars:
+                self.merged.union(self.component(costars[0]), self.component(p))
+            self.extra_movies.setdefault(p, []).append(m)
+            self.extra_stars.setdefault(m, []).append(p)
+            touched.add(m)
+
+        if self.landmarks is not None and touched:
+            self.landmarks.add_stars(touched)
+
+    def refresh(self):
+        """
+        Applies any deltas other processes have appended to the journal
+        since this graph last read it.
+        """
+        if self.journal is None:
+            return
+        try:
+            if os.path.getsize(self.journal) <= self.journal_position:
+                return
+            with open(self.journal, "rb") as f:
+                f.seek(self.journal_position)
+                for line in f:
+                    # Leave a partially written entry for the next refresh
+                    if not line.endswith(b"\n"):
+                        break
+                    entry = json.loads(line)
+                    if "stamp" not in entry:
+                        self.apply_delta(**entry, record=False)
+                    self.journal_position += len(line)
+        except FileNotFoundError:
+            pass
+
+    def extend(self, name, value):
+        """
+        Appends `value` to the table attribute `name`, first wrapping it
+        so that memory-mapped tables can grow.
+        """
+        table = getattr(self, name)
+        if not isinstance(table, Extended):
+            table = Extended(table)
+            setattr(self, name, table)
+        table.append(value)
+
+    @staticmethod
+    def find(index, key):
+        """
+        Returns `index(key)`, or None if `key` is unknown.
+        """
+        try:
+            return index(key)
+        except KeyError:
+            return None
+
+    def shortest_path(self, source, target):
+        """
+        Returns the shortest list of (movie_id, person_id) pairs
+        that connect the source to the target, using a breadth-first
+        search over the CSR arrays.
+
+        If no possible path, returns None.
+        """
+        s = self.person_index(source)
+        t = self.person_index(target)
+        self.num_explored = 0
+        if s == t:
+            return []
+        if not self.connected(s, t):
+            return None
+
+        parents = {s: None}
+        layer = [s]
+        while layer:
+            next_layer = []
+            for p in layer:
+                self.num_explored += 1
+                for m, q in self.neighbors(p):
+                    if q in parents:
+                        continue
+                    parents[q] = (m, p)
+                    if q == t:
+                        return self.trace(t, parents)
+                    next_layer.append(q)
+            layer = next_layer
+        return None
+
+    def bidirectional_shortest_path(self, source, target):
+        """
+        Returns the shortest list of (movie_id, person_id) pairs
+        that connect the source to the target, searching outward from
+        both ends of the CSR graph until the two searches meet.
+
+        If no possible path, returns None.
+        """
+        s = self.person_index(source)
+        t = self.person_index(target)
+        self.num_explored = 0
+        if s == t:
+            return []
+        if not self.connected(s, t):
+            return None
+
+        forward = {s: None}
+        backward = {t: None}
+        forward_layer = [s]
+        backward_layer = [t]
+        while forward_layer and backward_layer:
+            if len(forward_layer) <= len(backward_layer):
+                forward_layer, meeting = self.expand(forward_layer, forward, backward)
+            else:
+                backward_layer, meeting = self.expand(backward_layer, backward, forward)
+            if meeting is not None:
+                path = self.trace(meeting, forward)
+                q = meeting
+                while backward[q] is not None:
+                    m, q = backward[q]
+                    path.append((self.movie_ids[m], self.person_ids[q]))
+                return path
+        return None
+
+    def expand(self, layer, visited, other):
+        """
+        Expands every person index in `layer` by one step.
+
+        Returns the next layer and the first person index also seen by
+        the `other` search, or None if the searches have not met yet.
+        """
+        next_layer = []
+        for p in layer:
+            self.num_explored += 1
+            for m, q in self.neighbors(p):
+                if q in visited:
+                    continue
+                visited[q] = (m, p)
+                if q in other:
+                    return next_layer, q
+                next_layer.append(q)
+        return next_layer, None
+
+    def trace(self, q, parents):
+        """
+        Follows `parents` back from person index `q` and returns the
+        (movie_id, person_id) pairs leading to it.
+        """
+        path = []
+        while parents[q] is not None:
+            m, p = parents[q]
+            path.append((self.movie_ids[m], self.person_ids[q]))
+            q = p
+        path.reverse()
+        return path
+
+    def searches(self):
+        """
+        Returns the search strategies this graph supports, by name.
+        """
+        searches = {
+            "bfs": self.shortest_path,
+            "bidirectional": self.bidirectional_shortest_path,
+        }
+        if self.landmarks is not None:
+            searches["astar"] = self.landmarks.shortest_path
+        return searches
+
+
+class Extended():
+    """
+    Sequence made of an immutable `base` sequence followed by
+    a list of items appended to it.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.extra = []
+
+    def __len__(self):
+        return len(self.base) + len(self.extra)
+
+    def __getitem__(self, i):
+        if i < len(self.base):
+            return self.base[i]
+        return self.extra[i - len(self.base)]
+
+    def append(self, value):
+        self.extra.append(value)
+
+
+def read_delta(directory):
+    """
+    Returns the rows of the people, movies and stars CSV files in a delta
+    `directory` as a dictionary of lists, treating missing files as empty.
+    """
+    if not os.path.isdir(directory):
+        raise NotADirectoryError(directory)
+    rows = {}
+    for name in ("people", "movies", "stars"):
+        try:
+            with open(f"{directory}/{name}.csv", encoding="utf-8") as f:
+                rows[name] = list(csv.DictReader(f))
+        except FileNotFoundError:
+            rows[name] = []
+    return rows
+
+
+def dataset_stamp(directory):
+    """
+    Returns the fingerprint of the CSV files in `directory`,
+    used to tell whether files derived from them are up to date.
+    """
+    return snapshot.stamp(
+        os.path.join(directory, f"{name}.csv")
+        for name in ("people", "movies", "stars")
+    )
+
+
+def journal_stamp(path):
+    """
+    Returns the stamp recorded at the start of the journal at `path`,
+    or None if it is missing or has no stamp.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.loads(f.readline() or "{}")
+    except (FileNotFoundError, ValueError):
+        return None
+    return entry.get("stamp")
+
+
+def label_components(people, movie_offsets, movie_people):
+    """
+    Labels each of `people` person indices with the root of its connected
+    component, using union-find over the stars of every movie.
+    """
+    parent = array("i", range(people))
+
+    def find(p):
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    for m in range(len(movie_offsets) - 1):
+        start, end = movie_offsets[m], movie_offsets[m + 1]
+        if start == end:
+            continue
+        root = find(movie_people[start])
+        for k in range(start + 1, end):
+            other = find(movie_people[k])
+            if other != root:
+                parent[other] = root
+
+    return array("i", (find(p) for p in range(people)))
+
+
+def build_csr(rows, sources, targets):
+    """
+    Groups the edges `sources[i] -> targets[i]` by source with a counting
+    sort, dropping duplicate edges.
+
+    Returns the (offsets, indices) arrays of the resulting CSR matrix
+    with `rows` rows.
+    """
+    counts = array("i", bytes(4 * (rows + 1)))
+    for r in sources:
+        counts[r + 1] += 1
+    for r in range(rows):
+        counts[r + 1] += counts[r]
+
+    indices = array("i", bytes(4 * len(sources)))
+    cursor = array("i", counts)
+    for r, c in zip(sources, targets):
+        indices[cursor[r]] = c
+        cursor[r] += 1
+
+    # Sort and deduplicate each row in place, compacting as we go
+    offsets = array("i", [0])
+    end = 0
+    for r in range(rows):
+        row = sorted(set(indices[counts[r]:counts[r + 1]]))
+        indices[end:end + len(row)] = array("i", row)
+        end += len(row)
+        offsets.append(end)
+    del indices[end:]
+    return offsets, indices
+
+
+def sorted_order(keys, transform=None):
+    """
+    Returns an array of the indices of `keys`, ordered by key.
+    """
+    if transform is None:
+        key = keys.__getitem__
+    else:
+        key = lambda i: transform(keys[i])
+    return array("i", sorted(range(len(keys)), key=key))
+
+
+def equal_range(order, key, value):
+    """
+    Returns the indices in the sorted index `order` whose `key`
+    equals `value`.
+    """
+    lo = bisect_left(order, value, key=key)
+    hi = bisect_right(order, value, lo=lo, key=key)
+    return order[lo:hi]
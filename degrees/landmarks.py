@@ -0,0 +1,320 @@
+import heapq
+import os
+from array import array
+from collections import deque
+
+import snapshot
+from graph import dataset_stamp
+
+# Name of the landmark index file written next to a dataset's CSV files
+LANDMARKS = "landmarks.snapshot"
+
+# Number of landmarks picked when none is specified
+DEFAULT_LANDMARKS = 16
+
+# Number of landmarks each search consults, those giving the best lower
+# bounds on the distance between its two ends; consulting every landmark
+# for every person reached costs more than the tighter bounds save
+ACTIVE_LANDMARKS = 4
+
+
+class LandmarkIndex():
+    """
+    Breadth-first distances from a handful of landmark people to every
+    person in a StarGraph.
+
+    By the triangle inequality, |d(L, t) - d(L, v)| never overestimates
+    the distance from `v` to `t`, so the largest such bound over all
+    landmarks L is an admissible heuristic for A* search (the "ALT"
+    technique: A*, landmarks and triangle inequality).
+    """
+
+    def __init__(self, graph, landmarks, distances):
+        self.graph = graph
+        self.landmarks = landmarks
+
+        # distances[i * people + v] is the number of hops from landmark i
+        # to person v, or -1 if v cannot be reached from it
+        self.distances = distances
+
+        # Distances lowered by deltas applied to the graph, and those of
+        # people added since, keyed by (landmark number, person index)
+        self.overrides = {}
+
+    @classmethod
+    def build(cls, graph, k=DEFAULT_LANDMARKS):
+        """
+        Picks up to `k` landmarks and computes their distance tables.
+
+        The first landmark is the best-connected person. Each later one is
+        the person farthest from every landmark chosen so far, preferring
+        people no landmark can reach yet, so every component gets covered.
+        """
+        people = len(graph.person_offsets) - 1
+        degree = [
+            graph.person_offsets[p + 1] - graph.person_offsets[p]
+            for p in range(people)
+        ]
+        landmarks = array("i")
+        distances = array("i")
+        nearest = array("i", [-1]) * people
+
+        candidate = max(range(people), key=degree.__getitem__, default=None)
+        while candidate is not None and len(landmarks) < k:
+            landmark_distances = distances_from(graph, candidate)
+            landmarks.append(candidate)
+            distances.extend(landmark_distances)
+            for v, d in enumerate(landmark_distances):
+                if d >= 0 and (nearest[v] < 0 or d < nearest[v]):
+                    nearest[v] = d
+
+            unreached = [v for v in range(people) if nearest[v] < 0 and degree[v]]
+            if unreached:
+                candidate = max(unreached, key=degree.__getitem__)
+            else:
+                candidate = max(range(people), key=nearest.__getitem__)
+                if nearest[candidate] <= 0:
+                    candidate = None
+        return cls(graph, landmarks, distances)
+
+    @classmethod
+    def load(cls, graph, directory, k=DEFAULT_LANDMARKS):
+        """
+        Returns the landmark index for `graph`, reading it from the
+        dataset `directory` when an up-to-date copy was saved there,
+        and otherwise building it and saving it for next time.
+        """
+        path = os.path.join(directory, LANDMARKS)
+        fingerprint = {"dataset": dataset_stamp(directory), "landmarks": k}
+        sections = snapshot.read(path, fingerprint)
+        if sections is not None:
+            index = cls(graph, sections["landmarks"], sections["distances"])
+        else:
+            index = cls.build(graph, k)
+            try:
+                snapshot.write(path, {
+                    "landmarks": index.landmarks,
+                    "distances": index.distances,
+                }, fingerprint)
+            except OSError:
+                pass
+
+        # The saved distances only cover the snapshot, so account for
+        # any deltas the graph has applied on top of it
+        if graph.extra_stars:
+            index.add_stars(graph.extra_stars)
+        return index
+
+    def distance(self, i, v):
+        """
+        Returns the number of hops from landmark `i` to person index `v`,
+        or -1 if `v` cannot be reached from it.
+        """
+        d = self.overrides.get((i, v))
+        if d is not None:
+            return d
+        people = len(self.graph.person_offsets) - 1
+        return self.distances[i * people + v] if v < people else -1
+
+    def add_stars(self, movies):
+        """
+        Updates the distances after stars were added to `movies`.
+
+        New edges can only shorten distances, so each landmark's distances
+        are lowered starting from the affected stars and the changes are
+        propagated breadth-first; the work done is proportional to the
+        part of the graph whose distances actually change.
+        """
+        graph = self.graph
+        for i in range(len(self.landmarks)):
+            queue = deque()
+            for m in movies:
+                stars = graph.stars_of(m)
+                known = [d for d in (self.distance(i, q) for q in stars) if d >= 0]
+                if not known:
+                    continue
+                best = min(known) + 1
+                for q in stars:
+                    d = self.distance(i, q)
+                    if d < 0 or d > best:
+                        self.overrides[(i, q)] = best
+                        queue.append(q)
+
+            while queue:
+                p = queue.popleft()
+                d = self.distance(i, p) + 1
+                for _, q in graph.neighbors(p):
+                    dq = self.distance(i, q)
+                    if dq < 0 or dq > d:
+                        self.overrides[(i, q)] = d
+                        queue.append(q)
+
+    def potential(self, s, t):
+        """
+        Returns a function giving, for a person index, the lower bound on
+        its distance to person index `t` minus the lower bound on its
+        distance from person index `s`, both from the ACTIVE_LANDMARKS
+        landmarks that best bound the distance from `s` to `t`.
+
+        Half of this is the "average" potential of bidirectional ALT
+        search: it keeps the forward search, which adds it, and the
+        backward search, which subtracts it, consistent with each other.
+        """
+        people = len(self.graph.person_offsets) - 1
+        distances = self.distances
+
+        # Landmarks that cannot reach `s` and `t` cannot reach anyone in
+        # their component either, and bound nothing
+        active = sorted(
+            (i for i in range(len(self.landmarks)) if self.distance(i, s) >= 0),
+            key=lambda i: abs(self.distance(i, t) - self.distance(i, s)),
+            reverse=True,
+        )[:ACTIVE_LANDMARKS]
+        bases = [i * people for i in active]
+        ends = [(self.distance(i, s), self.distance(i, t)) for i in active]
+
+        def potential(v):
+            if self.overrides or v >= people:
+                return adjusted_potential(v)
+            to_target = from_source = 0
+            for base, (ds, dt) in zip(bases, ends):
+                dv = distances[base + v]
+                if dv >= 0:
+                    to_target = max(to_target, abs(dt - dv))
+                    from_source = max(from_source, abs(ds - dv))
+            return to_target - from_source
+
+        # Slower path that also consults distances changed by deltas
+        def adjusted_potential(v):
+            to_target = from_source = 0
+            for i, (ds, dt) in zip(active, ends):
+                dv = self.distance(i, v)
+                if dv >= 0:
+                    to_target = max(to_target, abs(dt - dv))
+                    from_source = max(from_source, abs(ds - dv))
+            return to_target - from_source
+
+        return potential
+
+    def shortest_path(self, source, target):
+        """
+        Returns the shortest list of (movie_id, person_id) pairs
+        that connect the source to the target, using bidirectional A*
+        search guided by the landmark distances.
+
+        If no possible path, returns None.
+
+        A forward search from the source and a backward search from the
+        target each run A* with half the potential, and the search with
+        the smaller frontier takes the next step. Every path through
+        their frontiers is at least as long as the sum of the two
+        smallest keys, so the best meeting point found is final once
+        that sum reaches its length. Small-world graphs have many short
+        paths and landmark bounds much below their length, so searching
+        from one end only would have to rule out nearly every person
+        within the distance of the target.
+
+        Each person is still keyed and pushed once for every side that
+        reaches it, so on graphs with large casts this expands fewer
+        people than bidirectional breadth-first search but is slower.
+        """
+        graph = self.graph
+        s = graph.person_index(source)
+        t = graph.person_index(target)
+        graph.num_explored = 0
+        if s == t:
+            return []
+        if not graph.connected(s, t):
+            return None
+
+        # Keys are doubled so that they stay integers, and ordered by
+        # length, then in favour of people farther along their path.
+        # Each side also keeps the cost at which it expanded each movie,
+        # since every star of a movie is reached through its first
+        # expansion unless a later one comes from a cheaper person
+        potential = self.potential(s, t)
+        potentials = {s: potential(s), t: potential(t)}
+        forward = ({s: None}, {s: 0}, [(potentials[s], 0, s)], 1, {})
+        backward = ({t: None}, {t: 0}, [(-potentials[t], 0, t)], -1, {})
+        length = meeting = None
+        while forward[2] and backward[2]:
+            if length is not None and forward[2][0][0] + backward[2][0][0] >= 2 * length:
+                break
+            if len(forward[2]) <= len(backward[2]):
+                side, other = forward, backward
+            else:
+                side, other = backward, forward
+            parents, cost, frontier, sign, expanded = side
+            key, g, v = heapq.heappop(frontier)
+            g = -g
+            if g > cost[v]:
+                continue
+            graph.num_explored += 1
+
+            found = False
+            for m in graph.movies_of(v):
+                if expanded.get(m, g + 1) <= g:
+                    continue
+                expanded[m] = g
+                for q in graph.stars_of(m):
+                    if q in cost and cost[q] <= g + 1:
+                        continue
+                    cost[q] = g + 1
+                    parents[q] = (m, v)
+                    if q not in potentials:
+                        potentials[q] = potential(q)
+                    heapq.heappush(frontier, (2 * (g + 1) + sign * potentials[q], -(g + 1), q))
+                    if q in other[1] and (length is None or g + 1 + other[1][q] < length):
+                        length = g + 1 + other[1][q]
+                        meeting = q
+
+                        # People reached from `v` have keys no smaller than
+                        # its own, so a meeting point that short cannot be
+                        # beaten
+                        if not other[2] or key + other[2][0][0] >= 2 * length:
+                            found = True
+                            break
+                if found:
+                    break
+
+        if meeting is None:
+            return None
+        path = graph.trace(meeting, forward[0])
+        q = meeting
+        while backward[0][q] is not None:
+            m, q = backward[0][q]
+            path.append((graph.movie_ids[m], graph.person_ids[q]))
+        return path
+
+
+def distances_from(graph, source):
+    """
+    Returns an array holding the number of hops from person index
+    `source` to every person, with -1 for people it cannot reach.
+    """
+    person_offsets, person_movies = graph.person_offsets, graph.person_movies
+    movie_offsets, movie_people = graph.movie_offsets, graph.movie_people
+    distances = array("i", [-1]) * (len(person_offsets) - 1)
+    seen_movies = bytearray(len(movie_offsets) - 1)
+
+    distances[source] = 0
+    layer = [source]
+    depth = 0
+    while layer:
+        depth += 1
+        next_layer = []
+        for p in layer:
+            for j in range(person_offsets[p], person_offsets[p + 1]):
+                m = person_movies[j]
+
+                # Every star of a movie is reached the first time it is seen
+                if seen_movies[m]:
+                    continue
+                seen_movies[m] = 1
+                for k in range(movie_offsets[m], movie_offsets[m + 1]):
+                    q = movie_people[k]
+                    if distances[q] < 0:
+                        distances[q] = depth
+                        next_layer.append(q)
+        layer = next_layer
+    return distances
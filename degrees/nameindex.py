@@ -0,0 +1,249 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from snapshot import StringTable
+
+# Length of the character n-grams used for fuzzy matching; longer ones
+# are rarer, so fewer names need looking at for each
+N = 4
+
+# Least distance between the positions of the three n-grams fuzzy
+# matches are drawn from; one typo changes at most N + 1 consecutive
+# n-grams, so with n-grams this far apart it spoils at most one of them
+SPREAD = N + 1
+
+# Posting lists longer than this are skipped during fuzzy lookup once
+# rarer n-grams have produced candidates; very common n-grams such as
+# "  jo" say little about a name but would cost a scan of millions
+MAX_POSTINGS = 5000
+
+# Postings read in all to rank fuzzy candidates, rarest n-grams first
+MAX_READ = 5000
+
+# Number of candidates rescored exactly during fuzzy lookup
+RESCORE = 20
+
+# Fuzzy matches scoring below this Dice coefficient are not returned
+MIN_SIMILARITY = 0.3
+
+
+class NameIndex():
+    """
+    Prefix and fuzzy lookup over a sorted sequence of lowercase names.
+
+    Prefix queries bisect the sorted names directly. Fuzzy queries use
+    `grams`, a Postings table from character n-grams to names, built on
+    first use unless given, and rank candidates by how many n-grams they
+    share with the query.
+    """
+
+    def __init__(self, names, grams=None):
+        # `names` may contain repeats, e.g. for people sharing a name
+        self.names = names
+        self.grams = grams
+
+        # Smaller NameIndex holding names added after construction
+        self.added = None
+
+    def add(self, name):
+        """
+        Adds `name` to the index in time proportional to the number of
+        names added so far, rather than to the size of the index.
+        """
+        if self.added is None:
+            self.added = NameIndex([])
+        insort(self.added.names, name.lower())
+        self.added.grams = None
+
+    def prefix(self, prefix, limit=10):
+        """
+        Returns up to `limit` distinct names starting with `prefix`,
+        in alphabetical order.
+        """
+        prefix = prefix.lower()
+        results = []
+        i = bisect_left(self.names, prefix)
+        while i < len(self.names) and len(results) < limit:
+            name = self.names[i]
+            if not name.startswith(prefix):
+                break
+            if not results or results[-1] != name:
+                results.append(name)
+            i += 1
+        if self.added is not None:
+            results = sorted(set(results + self.added.prefix(prefix, limit)))
+        return results[:limit]
+
+    def fuzzy(self, query, limit=10):
+        """
+        Returns up to `limit` distinct names that look most like `query`,
+        best match first.
+        """
+        results = self.scored(query)
+        if self.added is not None:
+            results = list(set(results + self.added.scored(query)))
+        results.sort(key=lambda result: (-result[0], result[1]))
+        return [name for _, name in results[:limit]]
+
+    def scored(self, query):
+        """
+        Returns (score, name) pairs for the names most similar to `query`,
+        scoring each by the Dice coefficient of their n-gram sets.
+        """
+        if self.grams is None:
+            self.build()
+
+        query = query.lower()
+        query_grams = ngrams(query)
+
+        # Probe the three rarest n-grams that lie far enough apart; a name
+        # one typo away from the query contains at least two of them, or
+        # one of them if fewer are rare enough to probe
+        padded = pad(query)
+        found = []
+        for i in range(len(padded) - N + 1):
+            posting = self.grams.get(padded[i:i + N])
+            if posting is not None:
+                found.append((len(posting), i, posting))
+        found.sort(key=lambda item: item[:2])
+        probes = []
+        for size, i, posting in found:
+            if size > MAX_POSTINGS and probes:
+                break
+            if all(abs(i - j) >= SPREAD for j, _ in probes):
+                probes.append((i, set(posting)))
+                if len(probes) == 3:
+                    break
+        if not probes:
+            return []
+        if len(probes) < 3:
+            candidates = set().union(*(names for _, names in probes))
+        else:
+            (_, a), (_, b), (_, c) = probes
+            candidates = (a & b) | (a & c) | (b & c)
+
+        # Rank the candidates by how many of the query's n-grams they
+        # share, reading postings until MAX_READ have been read, unless
+        # there are few enough to rescore them all
+        if len(candidates) > RESCORE:
+            shared = Counter()
+            budget = MAX_READ
+            for size, _, posting in found:
+                if (size > budget or size > MAX_POSTINGS) and shared:
+                    break
+                budget -= size
+                shared.update(candidates.intersection(posting))
+            candidates = [i for i, _ in shared.most_common(RESCORE)]
+
+        # Rescore the best candidates exactly, as only a few of their
+        # n-grams were looked at
+        results = []
+        for i in candidates:
+            grams = ngrams(self.names[i])
+            score = 2 * len(query_grams & grams) / (len(query_grams) + len(grams))
+            if score >= MIN_SIMILARITY:
+                results.append((score, self.names[i]))
+        return results
+
+    def suggest(self, query, limit=5):
+        """
+        Returns up to `limit` distinct names for a partial or misspelled
+        `query`, listing prefix matches before fuzzy ones.
+        """
+        results = self.prefix(query, limit)
+        if len(results) < limit:
+            for name in self.fuzzy(query, limit):
+                if name not in results:
+                    results.append(name)
+        return results[:limit]
+
+    def build(self):
+        """
+        Builds the n-gram index.
+        """
+        self.grams = Postings.from_names(self.names)
+
+
+class Postings():
+    """
+    Read-only mapping from n-grams to arrays of name positions.
+
+    The n-grams are kept sorted in the StringTable `keys`, and the names
+    containing n-gram `i` are `positions[offsets[i]:offsets[i + 1]]`, so
+    the table can be saved in a snapshot and memory-mapped back.
+    """
+
+    def __init__(self, keys, offsets, positions):
+        self.keys = keys
+        self.offsets = offsets
+        self.positions = positions
+
+    @classmethod
+    def from_names(cls, names):
+        """
+        Returns the postings of the sorted sequence `names`, with one
+        entry per distinct name.
+        """
+        grams = defaultdict(lambda: array("i"))
+        previous = None
+        for i in range(len(names)):
+            name = names[i]
+            if name == previous:
+                continue
+            previous = name
+            for gram in ngrams(name):
+                grams[gram].append(i)
+
+        keys = sorted(grams)
+        offsets = array("i", [0])
+        positions = array("i")
+        for gram in keys:
+            positions.extend(grams.pop(gram))
+            offsets.append(len(positions))
+        return cls(StringTable.from_strings(keys), offsets, positions)
+
+    def get(self, gram):
+        """
+        Returns the positions of the names containing `gram`,
+        or None if there are none.
+        """
+        i = bisect_left(self.keys, gram)
+        if i == len(self.keys) or self.keys[i] != gram:
+            return None
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+
+class SortedView():
+    """
+    Read-only sequence presenting `values` in the order given by the index
+    array `order`, with `transform` applied to each item.
+    """
+
+    def __init__(self, values, order, transform=None):
+        self.values = values
+        self.order = order
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, i):
+        value = self.values[self.order[i]]
+        return value if self.transform is None else self.transform(value)
+
+
+def pad(name):
+    """
+    Returns `name` padded with spaces so that its start and end
+    count towards its n-grams as well.
+    """
+    return f"{' ' * (N - 1)}{name} "
+
+
+def ngrams(name):
+    """
+    Returns the set of character n-grams of `name`.
+    """
+    padded = pad(name)
+    return {padded[i:i + N] for i in range(len(padded) - N + 1)}
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from graph import StarGraph, read_delta
+from landmarks import LandmarkIndex
+
+# Graph loaded once per process; worker processes memory-map the same
+# snapshot, so the operating system shares its pages between them
+graph = None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="server.py",
+        description="Answer many shortest-path queries against one loaded dataset."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--search", default="bidirectional",
+                        help="default search strategy for queries")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer the (source, target) pairs in a CSV file and exit")
+    parser.add_argument("--socket", default="degrees.sock",
+                        help="path of the Unix socket to listen on")
+    parser.add_argument("--landmarks", type=int, default=0,
+                        help="number of landmarks to index, enabling astar search, "
+                             "which is slower than bidirectional on hub-heavy graphs")
+    args = parser.parse_args()
+
+    print("Loading data...", file=sys.stderr)
+    load(args.directory, args.landmarks)
+    if args.search not in graph.searches():
+        sys.exit(f"Unknown search: {args.search}")
+    print("Data loaded.", file=sys.stderr)
+
+    with ProcessPoolExecutor(args.workers, initializer=load,
+                             initargs=(args.directory, args.landmarks)) as pool:
+        if args.batch:
+            pairs = read_pairs(args.batch)
+            for result in run_batch(pool, pairs, args.search, args.workers):
+                print(json.dumps(result))
+        else:
+            try:
+                asyncio.run(serve(pool, args.socket, args.search))
+            except KeyboardInterrupt:
+                pass
+
+
+def load(directory, landmarks=0):
+    """
+    Loads the graph for `directory` into this process, along with
+    its landmark index if `landmarks` is positive.
+    """
+    global graph
+    graph = StarGraph.load(directory)
+    if landmarks > 0:
+        graph.landmarks = LandmarkIndex.load(graph, directory, landmarks)
+
+
+def read_pairs(filename):
+    """
+    Yields (source, target) pairs from the first two columns of a CSV file,
+    skipping blank lines and a `source,target` header if present.
+    """
+    with open(filename, encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[:2] == ["source", "target"]:
+                continue
+            yield row[0], row[1]
+
+
+def run_batch(pool, pairs, search, workers):
+    """
+    Fans `pairs` out across the worker pool and yields one result
+    per pair, in input order.
+    """
+    pairs = list(pairs)
+    chunksize = max(1, len(pairs) // (4 * workers))
+    yield from pool.map(answer, pairs, [search] * len(pairs), chunksize=chunksize)
+
+
+async def serve(pool, path, search):
+    """
+    Listens on a Unix socket at `path` and answers one JSON query per line.
+
+    Each query is an object with `source` and `target` (names or IMDB ids)
+    and an optional `search`; each reply is the object returned by `answer`.
+    A query of the form {"delta": directory} instead applies the CSV files
+    in that directory to the graph, and workers pick the change up from
+    the snapshot's journal before answering their next query.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def handle(reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    query = json.loads(line)
+                    if "delta" in query:
+                        rows = read_delta(query["delta"])
+                        graph.apply_delta(**rows)
+                        result = {"applied": {name: len(rows[name]) for name in rows}}
+                    else:
+                        pair = (query["source"], query["target"])
+                        strategy = query.get("search", search)
+                        if not all(isinstance(value, str) for value in (*pair, strategy)):
+                            raise TypeError("source, target and search must be strings")
+
+                        # A failure in the worker answers this query only,
+                        # rather than dropping the client's connection
+                        try:
+                            result = await loop.run_in_executor(
+                                pool, answer, pair, strategy
+                            )
+                        except Exception as e:
+                            result = {"source": pair[0], "target": pair[1],
+                                      "error": f"search failed: {e!r}"}
+                except OSError as e:
+                    result = {"error": f"cannot apply delta: {e}"}
+                except (ValueError, KeyError, TypeError) as e:
+                    result = {"error": f"bad query: {e}"}
+                writer.write(json.dumps(result).encode("utf-8") + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(handle, path=path)
+    print(f"Listening on {path}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def answer(pair, search):
+    """
+    Finds the shortest path for one (source, target) pair.
+
+    Returns a JSON-serializable dictionary holding either the path as
+    (movie_id, person_id) pairs and its length, or an error message.
+    """
+    source, target = pair
+    graph.refresh()
+    searches = graph.searches()
+    if search not in searches:
+        return {"source": source, "target": target,
+                "error": f"unknown search: {search}"}
+
+    ids = []
+    for name in pair:
+        person_ids = resolve(name)
+        if not person_ids:
+            return {"source": source, "target": target,
+                    "error": f"{name!r} is not found", "suggestions": suggest(name)}
+        if len(person_ids) > 1:
+            return {"source": source, "target": target,
+                    "error": f"{name!r} is ambiguous", "candidates": person_ids}
+        ids.append(person_ids[0])
+
+    path = searches[search](*ids)
+    return {
+        "source": ids[0],
+        "target": ids[1],
+        "degrees": None if path is None else len(path),
+        "path": path,
+    }
+
+
+def resolve(name):
+    """
+    Returns the IMDB ids matching `name`, which may be either a
+    person's name or their IMDB id.
+    """
+    person_ids = graph.person_ids_for_name(name)
+    if not person_ids:
+        try:
+            graph.person_index(name)
+            person_ids = [name]
+        except KeyError:
+            pass
+    return person_ids
+
+
+def suggest(name, limit=5):
+    """
+    Returns the names of up to `limit` people whose names start with,
+    or closely resemble, `name`.
+    """
+    return [
+        graph.person(graph.person_ids_for_name(key)[0])["name"]
+        for key in graph.name_index().suggest(name, limit)
+    ]
+
+
+if __name__ == "__main__":
+    main()
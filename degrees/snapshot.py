@@ -0,0 +1,132 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+
+MAGIC = b"DEGSNAP1"
+
+# Sections are aligned to this many bytes so they can be cast in place
+ALIGNMENT = 8
+
+
+class StringTable():
+    """
+    Immutable sequence of strings packed into one UTF-8 blob, with
+    `offsets[i]:offsets[i + 1]` marking where string `i` lives.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def from_strings(cls, strings):
+        offsets = array("q", [0])
+        blob = bytearray()
+        for s in strings:
+            blob += s.encode("utf-8")
+            offsets.append(len(blob))
+        return cls(offsets, bytes(blob))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def stamp(paths):
+    """
+    Returns a fingerprint of `paths` built from each file's
+    modification time and size.
+    """
+    result = {}
+    for path in paths:
+        info = os.stat(path)
+        result[os.path.basename(path)] = [info.st_mtime_ns, info.st_size]
+    return result
+
+
+def write(path, sections, fingerprint):
+    """
+    Writes `sections`, a dictionary mapping names to arrays, bytes or
+    StringTables, to a snapshot file at `path` tagged with `fingerprint`.
+
+    The file is written to a temporary name first and moved into place,
+    so readers never observe a partial snapshot.
+    """
+    layout = {}
+    chunks = []
+    position = 0
+
+    def place(name, kind, data):
+        nonlocal position
+        position += -position % ALIGNMENT
+        layout[name] = [kind, position, len(data)]
+        chunks.append((position, data))
+        position += len(data)
+
+    for name, value in sections.items():
+        if isinstance(value, StringTable):
+            place(name + ".offsets", value.offsets.typecode, value.offsets.tobytes())
+            place(name + ".blob", "b", bytes(value.blob))
+        elif isinstance(value, array):
+            place(name, value.typecode, value.tobytes())
+        else:
+            place(name, "b", bytes(value))
+
+    header = json.dumps({"stamp": fingerprint, "sections": layout}).encode("utf-8")
+    start = len(MAGIC) + 4 + len(header)
+    start += -start % ALIGNMENT
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for offset, data in chunks:
+            f.seek(start + offset)
+            f.write(data)
+    os.replace(temporary, path)
+
+
+def read(path, fingerprint=None):
+    """
+    Memory-maps the snapshot at `path` and returns a dictionary of its
+    sections as zero-copy views.
+
+    Returns None if the file is missing, is not a snapshot, or was written
+    with a different `fingerprint`.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        header = json.loads(f.read(struct.unpack("<I", f.read(4))[0]))
+        if fingerprint is not None and header["stamp"] != fingerprint:
+            return None
+        start = f.tell()
+        start += -start % ALIGNMENT
+        buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    sections = {}
+    for name, (kind, offset, length) in header["sections"].items():
+        view = buffer[start + offset:start + offset + length]
+        sections[name] = view if kind == "b" else view.cast(kind)
+
+    # Reassemble string tables from their offset and blob sections
+    for name in list(sections):
+        if name.endswith(".offsets"):
+            base = name[:-len(".offsets")]
+            sections[base] = StringTable(
+                sections.pop(name), sections.pop(base + ".blob")
+            )
+    return sections
@@ -0,0 +1,90 @@
+from collections import deque
+
+
+class Node():
+    def __init__(self, state, parent, action):
+        self.state = state
+        self.parent = parent
+        self.action = action
+
+
+class StackFrontier():
+    """
+    Last-in, first-out frontier.
+
+    Nodes are kept in a deque, and the states they hold are counted in a
+    dictionary, so adding, removing and membership tests are all O(1).
+    """
+
+    def __init__(self):
+        self.frontier = deque()
+        self.states = {}
+
+    def add(self, node):
+        self.frontier.append(node)
+        self.states[node.state] = self.states.get(node.state, 0) + 1
+
+    def contains_state(self, state):
+        return state in self.states
+
+    def empty(self):
+        return len(self.frontier) == 0
+
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        return self.discard(self.frontier.pop())
+
+    def discard(self, node):
+        """
+        Forgets one occurrence of `node`'s state and returns the node.
+        """
+        count = self.states[node.state]
+        if count == 1:
+            del self.states[node.state]
+        else:
+            self.states[node.state] = count - 1
+        return node
+
+
+class QueueFrontier(StackFrontier):
+    """
+    First-in, first-out frontier.
+    """
+
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        return self.discard(self.frontier.popleft())
+
+
+class DisjointSet():
+    """
+    Union-find over arbitrary hashable items, with union by size and
+    path halving, so both operations run in near-constant time.
+
+    Items that were never unioned are treated as singleton sets.
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        parent = self.parent
+        while parent.get(item, item) != item:
+            parent[item] = parent.get(parent[item], parent[item])
+            item = parent[item]
+        return item
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size.get(a, 1) < self.size.get(b, 1):
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] = self.size.get(a, 1) + self.size.pop(b, 1)
+
+    def connected(self, a, b):
+        return self.find(a) == self.find(b)
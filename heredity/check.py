@@ -0,0 +1,66 @@
+import os
+import sys
+
+from heredity import enumerate_probabilities, inference_methods, load_data
+from sampling import TOLERANCE
+
+# Families every method is checked on
+FAMILIES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", f"family{i}.csv")
+    for i in range(3)
+]
+
+# Largest difference from enumeration allowed for the exact methods
+EXACT = 1e-9
+
+# Largest difference allowed for the samplers, whose standard errors are
+# kept below TOLERANCE, so that a correct sampler practically never fails
+SAMPLED = 10 * TOLERANCE
+
+SAMPLERS = ("weighting", "gibbs")
+
+
+def main():
+    """
+    Compare every method's probabilities with `enumerate_probabilities`
+    on each family, and exit with an error if any of them disagree.
+    """
+    methods = inference_methods()
+    failures = 0
+    for family in FAMILIES:
+        people = load_data(family)
+        expected = enumerate_probabilities(people)
+        for name, method in methods.items():
+            if name == "enumerate":
+                continue
+            tolerance = SAMPLED if name in SAMPLERS else EXACT
+            difference = largest_difference(method(people), expected)
+            passed = difference <= tolerance
+            failures += not passed
+            print(f"{os.path.basename(family)}  {name:<12} {difference:.2e}  "
+                  f"{'ok' if passed else 'FAILED'}")
+    if failures:
+        sys.exit(f"{failures} check(s) failed")
+
+
+def largest_difference(probabilities, expected):
+    """
+    Return the largest absolute difference between two probabilities
+    tables, or infinity if they do not cover the same people and values.
+    """
+    if set(probabilities) != set(expected):
+        return float("inf")
+    difference = 0
+    for person in expected:
+        for field in expected[person]:
+            for value in expected[person][field]:
+                try:
+                    p = probabilities[person][field][value]
+                except KeyError:
+                    return float("inf")
+                difference = max(difference, abs(p - expected[person][field][value]))
+    return difference
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from heredity import PROBS
+from peeling import GENES, evidence, inheritance
+
+# Steps between recomputing the joint probability from scratch, which
+# stops the rounding errors of incremental updates from building up
+REFRESH = 4096
+
+
+def gray_code_probabilities(people):
+    """
+    Compute every person's gene and trait distributions by enumerating
+    every gene assignment, like `enumerate_probabilities`, but in a Gray
+    code order in which consecutive assignments differ in one person's
+    gene.
+
+    The joint probability is a product with one factor per person, and
+    changing a person's gene only changes their own factor and those of
+    their children, so each step costs time proportional to the size of
+    that family rather than to the number of people. Unknown traits are
+    summed out rather than enumerated, as summing over both values of a
+    trait multiplies the joint probability by 1.
+    """
+    names = list(people)
+    n = len(names)
+    index = {name: i for i, name in enumerate(names)}
+    parents = [
+        None if people[name]["father"] is None
+        else (index[people[name]["mother"]], index[people[name]["father"]])
+        for name in names
+    ]
+    children = [[] for _ in names]
+    for i, pair in enumerate(parents):
+        if pair is not None:
+            children[pair[0]].append(i)
+            if pair[1] != pair[0]:
+                children[pair[1]].append(i)
+
+    genes = [0] * n
+
+    def factor(i):
+        if parents[i] is None:
+            p = PROBS["gene"][genes[i]]
+        else:
+            mother, father = parents[i]
+            p = inheritance(genes[i], genes[mother], genes[father])
+        return p * evidence(people[names[i]], genes[i])
+
+    factors = [factor(i) for i in range(n)]
+    joint = product(factors)
+
+    # Rather than adding each joint probability to every person's totals,
+    # keep a running sum of them all and credit a person with the part of
+    # it accrued since their gene last changed
+    accrued = joint
+    since = [0.0] * n
+    genes_total = [[0.0] * 3 for _ in names]
+
+    for step, (i, gene) in enumerate(gray_code(n, 3), start=1):
+        genes_total[i][genes[i]] += accrued - since[i]
+        since[i] = accrued
+        genes[i] = gene
+
+        for j in [i] + children[i]:
+            old = factors[j]
+            factors[j] = factor(j)
+            if old:
+                joint *= factors[j] / old
+            else:
+                joint = product(factors)
+        if step % REFRESH == 0:
+            joint = product(factors)
+        accrued += joint
+
+    probabilities = dict()
+    for i, name in enumerate(names):
+        genes_total[i][genes[i]] += accrued - since[i]
+        total = sum(genes_total[i])
+        gene = {g: genes_total[i][g] / total for g in (2, 1, 0)}
+        if people[name]["trait"] is None:
+            p = sum(gene[g] * PROBS["trait"][g][True] for g in GENES)
+        else:
+            p = float(people[name]["trait"])
+        probabilities[name] = {"gene": gene, "trait": {True: p, False: 1 - p}}
+    return probabilities
+
+
+def gray_code(n, radix):
+    """
+    Generate the steps of the reflected Gray code over `n` digits in base
+    `radix`, starting from all zeros; each step is a (digit, new value)
+    pair changing one digit by 1.
+
+    This is Knuth's loopless Algorithm H (The Art of Computer
+    Programming, 7.2.1.1), which finds the digit to change in constant
+    time using "focus pointers".
+    """
+    digits = [0] * n
+    focus = list(range(n + 1))
+    directions = [1] * n
+    while True:
+        j = focus[0]
+        focus[0] = 0
+        if j == n:
+            return
+        digits[j] += directions[j]
+        if digits[j] == 0 or digits[j] == radix - 1:
+            directions[j] = -directions[j]
+            focus[j] = focus[j + 1]
+            focus[j + 1] = j + 1
+        yield j, digits[j]
+
+
+def product(values):
+    """
+    Return the product of `values`.
+    """
+    p = 1
+    for value in values:
+        p *= value
+    return p
@@ -1,3 +1,4 @@
+import argparse
 import csv
 import itertools
 import sys
@@ -38,11 +39,44 @@ PROBS = {
 
 
 def main():
+    methods = inference_methods()
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        prog="heredity.py",
+        description="Compute gene and trait probabilities for a family."
+    )
+    parser.add_argument("data")
+    parser.add_argument("--method", choices=list(methods), default="enumerate",
+                        help="exact inference by enumerating every assignment, "
+                             "in Python, across processes, in Gray code order "
+                             "or batched with NumPy, or by peeling the pedigree; "
+                             "or approximate inference by likelihood weighting "
+                             "or Gibbs sampling")
+    args = parser.parse_args()
+    people = load_data(args.data)
+
+    try:
+        probabilities = methods[args.method](people)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def enumerate_probabilities(people):
+    """
+    Compute every person's gene and trait distributions by summing the
+    joint probability of every assignment of genes and traits that is
+    consistent with the known traits in `people`.
+    """
 
     # Keep track of gene and trait probabilities for each person
     probabilities = {
@@ -83,15 +117,31 @@ def main():
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
+    return probabilities
 
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+
+def inference_methods():
+    """
+    Return the ways of computing the probabilities, by name; all are
+    exact except for the samplers, "weighting" and "gibbs".
+    """
+
+    # The other modules build on this one, so they are only imported
+    # once it has loaded
+    import graycode
+    import parallel
+    import peeling
+    import sampling
+    import vectorized
+    return {
+        "enumerate": enumerate_probabilities,
+        "parallel": parallel.parallel_probabilities,
+        "gray": graycode.gray_code_probabilities,
+        "vectorized": vectorized.vectorized_probabilities,
+        "peeling": peeling.peel,
+        "weighting": sampling.weighting_probabilities,
+        "gibbs": sampling.gibbs_probabilities,
+    }
 
 
 def load_data(filename):
@@ -315,6 +365,5 @@ def findMinTrait(num1, num2):
     return minVal
 
 
-
 if __name__ == "__main__":
     main()
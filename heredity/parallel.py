@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from heredity import joint_probability, normalize, powerset, update
+
+# Chunks of work handed to each worker, so a worker that finishes early
+# can pick up more
+CHUNKS_PER_WORKER = 4
+
+# Family being enumerated, and its trait and gene sets, in each worker
+family = None
+
+
+def parallel_probabilities(people, workers=None):
+    """
+    Compute every person's gene and trait distributions like
+    `enumerate_probabilities`, splitting the assignments across a pool
+    of `workers` processes.
+
+    Each (have_trait, one_gene) pair, with all the two_genes sets that
+    go with it, is one unit of work. The units are numbered and split
+    into contiguous chunks. Every worker sums its chunks into a local
+    probabilities table, and the tables are added up before normalizing.
+    """
+    workers = workers or os.cpu_count()
+    trait_sets, gene_sets = assignments(people)
+    units = len(trait_sets) * len(gene_sets)
+    chunk = max(1, -(-units // (workers * CHUNKS_PER_WORKER)))
+    bounds = [(start, min(start + chunk, units)) for start in range(0, units, chunk)]
+
+    probabilities = empty_table(people)
+    with ProcessPoolExecutor(workers, initializer=share_family, initargs=(people,)) as pool:
+        for local in pool.map(enumerate_chunk, bounds):
+            for person in probabilities:
+                for field in probabilities[person]:
+                    for value in probabilities[person][field]:
+                        probabilities[person][field][value] += local[person][field][value]
+
+    normalize(probabilities)
+    return probabilities
+
+
+def assignments(people):
+    """
+    Return the sets of people who might have the trait given the known
+    traits in `people`, and the sets of people who might have one copy
+    of the gene, in a fixed order.
+    """
+    names = sorted(people)
+    trait_sets = [
+        have_trait for have_trait in powerset(names)
+        if not any(
+            people[person]["trait"] is not None and
+            people[person]["trait"] != (person in have_trait)
+            for person in names
+        )
+    ]
+    return trait_sets, powerset(names)
+
+
+def empty_table(people):
+    """
+    Return a probabilities table with every probability set to 0.
+    """
+    return {
+        person: {"gene": {2: 0, 1: 0, 0: 0}, "trait": {True: 0, False: 0}}
+        for person in people
+    }
+
+
+def share_family(people):
+    """
+    Store the family and its assignments for the tasks in this process.
+    """
+    global family
+    family = (people, *assignments(people))
+
+
+def enumerate_chunk(bounds):
+    """
+    Return the unnormalized probabilities table summed over the units of
+    work numbered from bounds[0] up to bounds[1].
+    """
+    people, trait_sets, gene_sets = family
+    names = set(people)
+    probabilities = empty_table(people)
+    for unit in range(*bounds):
+        have_trait = trait_sets[unit // len(gene_sets)]
+        one_gene = gene_sets[unit % len(gene_sets)]
+        for two_genes in powerset(sorted(names - one_gene)):
+            p = joint_probability(people, one_gene, two_genes, have_trait)
+            update(probabilities, one_gene, two_genes, have_trait, p)
+    return probabilities
@@ -0,0 +1,236 @@
+import heapq
+import itertools
+
+from heredity import PROBS
+
+# Number of copies of the gene a person can have
+GENES = (0, 1, 2)
+
+# Largest clique peeled, as tables hold 3 ** size entries; only pedigrees
+# with many intermarriages need more
+MAX_CLIQUE = 12
+
+
+def peel(people):
+    """
+    Compute every person's gene and trait distributions given the known
+    traits in `people`, by exact variable elimination over the pedigree.
+
+    Returns a dictionary in the form `main` prints: for each person,
+    a "gene" distribution over 0, 1 and 2 copies and a "trait"
+    distribution over True and False, each summing to 1.
+
+    Each person's gene is a variable with one factor: the prior for
+    people without parents, or the probability of inheriting it from
+    their parents otherwise, times the probability of their known trait.
+    The variables are eliminated one at a time into a tree of cliques,
+    and passing messages up and back down that tree gives all marginals
+    at once; for pedigrees without marriage loops the cliques stay small
+    and the work grows linearly with the number of people.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+
+    factors = []
+    for name in names:
+        person = people[name]
+        if person["father"] is None:
+            scope = (index[name],)
+            table = {(g,): PROBS["gene"][g] * evidence(person, g) for g in GENES}
+        else:
+            scope = (index[name], index[person["mother"]], index[person["father"]])
+            table = {
+                (g, mother, father):
+                    inheritance(g, mother, father) * evidence(person, g)
+                for g, mother, father in itertools.product(GENES, repeat=3)
+            }
+        factors.append((scope, table))
+
+    cliques, parents, homes = junction_tree(len(names), [scope for scope, _ in factors])
+
+    # Each clique's potential is the product of the factors assigned to it
+    assigned = [[] for _ in cliques]
+    for factor, home in zip(factors, homes):
+        assigned[home].append(factor)
+    potentials = [product(clique, assigned[i]) for i, clique in enumerate(cliques)]
+
+    # Collect messages towards the roots, then distribute them back; the
+    # message between a clique and its parent is over all but the
+    # clique's first variable
+    children = [[] for _ in cliques]
+    for i, parent in enumerate(parents):
+        if parent is not None:
+            children[parent].append(i)
+    upward = [None] * len(cliques)
+    for i, clique in enumerate(cliques):
+        if parents[i] is not None:
+            incoming = [(cliques[c][1:], upward[c]) for c in children[i]]
+            upward[i] = message(clique, potentials[i], incoming, clique[1:])
+    downward = [None] * len(cliques)
+    for i in reversed(range(len(cliques))):
+        for c in children[i]:
+            incoming = [
+                (cliques[other][1:], upward[other])
+                for other in children[i] if other != c
+            ]
+            if downward[i] is not None:
+                incoming.append((cliques[i][1:], downward[i]))
+            downward[c] = message(cliques[i], potentials[i], incoming, cliques[c][1:])
+
+    # Read each person's marginal from the clique where they were eliminated
+    probabilities = dict()
+    for i, clique in enumerate(cliques):
+        incoming = [(cliques[c][1:], upward[c]) for c in children[i]]
+        if downward[i] is not None:
+            incoming.append((cliques[i][1:], downward[i]))
+        belief = message(clique, potentials[i], incoming, (clique[0],))
+        name = names[clique[0]]
+        gene = {g: belief[(g,)] for g in (2, 1, 0)}
+        probabilities[name] = {"gene": gene, "trait": trait(people[name], gene)}
+    return {name: probabilities[name] for name in names}
+
+
+def evidence(person, gene):
+    """
+    Return the probability of the person's known trait given `gene`
+    copies of the gene, or 1 if their trait is unknown.
+    """
+    if person["trait"] is None:
+        return 1
+    return PROBS["trait"][gene][person["trait"]]
+
+
+def inheritance(gene, mother, father):
+    """
+    Return the probability that a child has `gene` copies of the gene
+    given the number of copies their mother and father have.
+    """
+    from_mother = passes(mother)
+    from_father = passes(father)
+    if gene == 2:
+        return from_mother * from_father
+    if gene == 1:
+        return from_mother * (1 - from_father) + from_father * (1 - from_mother)
+    return (1 - from_mother) * (1 - from_father)
+
+
+def passes(gene):
+    """
+    Return the probability that a parent with `gene` copies of the gene
+    passes a copy on, accounting for mutation.
+    """
+    if gene == 2:
+        return 1 - PROBS["mutation"]
+    if gene == 1:
+        return 0.5
+    return PROBS["mutation"]
+
+
+def trait(person, gene):
+    """
+    Return the trait distribution of `person` given their marginal
+    `gene` distribution.
+    """
+    if person["trait"] is not None:
+        return {True: float(person["trait"]), False: float(not person["trait"])}
+    has_trait = sum(gene[g] * PROBS["trait"][g][True] for g in GENES)
+    return {True: has_trait, False: 1 - has_trait}
+
+
+def junction_tree(n, scopes):
+    """
+    Eliminate `n` variables connected by the factor `scopes`, each time
+    choosing the variable whose elimination adds the fewest new edges.
+
+    Returns the cliques in elimination order, each a tuple starting with
+    the variable eliminated to form it; the parent of each clique in the
+    junction tree, or None for a root; and the clique each factor was
+    assigned to.
+    """
+    neighbors = [set() for _ in range(n)]
+    for scope in scopes:
+        for u, v in itertools.combinations(scope, 2):
+            neighbors[u].add(v)
+            neighbors[v].add(u)
+
+    def fill(v):
+        return sum(
+            1 for a, b in itertools.combinations(neighbors[v], 2)
+            if b not in neighbors[a]
+        )
+
+    heap = [(fill(v), len(neighbors[v]), v) for v in range(n)]
+    heapq.heapify(heap)
+    position = [None] * n
+    cliques = []
+    while heap:
+        cost, _, v = heapq.heappop(heap)
+        if position[v] is not None or cost != fill(v):
+            continue
+        position[v] = len(cliques)
+        cliques.append((v,) + tuple(sorted(neighbors[v])))
+        if len(cliques[-1]) > MAX_CLIQUE:
+            raise ValueError("pedigree has too many loops to peel exactly")
+
+        # Connect the remaining neighbors to each other and drop `v`
+        for a, b in itertools.combinations(neighbors[v], 2):
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+        for u in neighbors[v]:
+            neighbors[u].discard(v)
+        touched = set(neighbors[v])
+        for u in neighbors[v]:
+            touched |= neighbors[u]
+        for u in touched:
+            heapq.heappush(heap, (fill(u), len(neighbors[u]), u))
+        neighbors[v] = set()
+
+    # A clique's separator is all but its first variable, and the parent
+    # clique is the one formed when the first of those was eliminated
+    parents = [
+        min((position[u] for u in clique[1:]), default=None)
+        for clique in cliques
+    ]
+    homes = [min(position[v] for v in scope) for scope in scopes]
+    return cliques, parents, homes
+
+
+def product(variables, factors):
+    """
+    Return the table over `variables` of the product of `factors`,
+    each a (scope, table) pair with scope a subset of `variables`.
+    """
+    positions = [
+        (tuple(variables.index(v) for v in scope), table)
+        for scope, table in factors
+    ]
+    result = {}
+    for assignment in itertools.product(GENES, repeat=len(variables)):
+        p = 1
+        for where, table in positions:
+            p *= table[tuple(assignment[i] for i in where)]
+        result[assignment] = p
+    return result
+
+
+def message(variables, potential, incoming, keep):
+    """
+    Return the table over the variables `keep` obtained by multiplying
+    `potential`, a table over `variables`, by the `incoming` messages,
+    each a (scope, table) pair, and summing out every other variable.
+
+    The result is scaled to sum to 1, since only its proportions matter
+    and the unscaled products of hundreds of probabilities underflow.
+    """
+    incoming = [
+        (tuple(variables.index(v) for v in scope), table)
+        for scope, table in incoming
+    ]
+    kept = tuple(variables.index(v) for v in keep)
+    result = dict.fromkeys(itertools.product(GENES, repeat=len(keep)), 0)
+    for assignment, p in potential.items():
+        for where, table in incoming:
+            p *= table[tuple(assignment[i] for i in where)]
+        result[tuple(assignment[i] for i in kept)] += p
+    total = sum(result.values())
+    return {assignment: p / total for assignment, p in result.items()}
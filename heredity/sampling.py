@@ -0,0 +1,363 @@
+import itertools
+import sys
+
+import numpy as np
+
+from heredity import PROBS
+from vectorized import inheritance_table
+
+# Number of samples drawn together, or of Gibbs chains run side by side
+CHAINS = 1000
+
+# Sampling stops once every standard error is below this
+TOLERANCE = 0.005
+
+# Sampling also stops after this many samples, however uncertain
+MAX_SAMPLES = 1000000
+
+# Effective samples likelihood weighting needs before its standard errors
+# are trusted; when a few samples carry all the weight the errors shrink
+# along with the samples' spread, however wrong the estimate is
+MIN_EFFECTIVE_SAMPLES = 1000
+
+# Gibbs sweeps discarded while the chains move away from their start
+BURN_IN = 50
+
+
+class Pedigree():
+    """
+    The heredity model for the people from `load_data`, as arrays.
+
+    Person `i` is `names[i]`; a child's parents are `mothers[i]` and
+    `fathers[i]`, and -1 for people without parents. Log probabilities
+    are used throughout, since the product over hundreds of people
+    underflows.
+    """
+
+    def __init__(self, people):
+        self.people = people
+        self.names = list(people)
+        index = {name: i for i, name in enumerate(self.names)}
+        self.mothers = np.array([
+            -1 if people[name]["mother"] is None else index[people[name]["mother"]]
+            for name in self.names
+        ])
+        self.fathers = np.array([
+            -1 if people[name]["father"] is None else index[people[name]["father"]]
+            for name in self.names
+        ])
+        self.children = [
+            np.flatnonzero((self.mothers == i) | (self.fathers == i))
+            for i in range(len(self.names))
+        ]
+
+        self.prior = np.array([PROBS["gene"][g] for g in range(3)])
+        self.inheritance = inheritance_table()
+        self.has_trait = np.array([PROBS["trait"][g][True] for g in range(3)])
+
+        # log_evidence[i, g] is the log probability of person i's known
+        # trait given g copies of the gene, or 0 if the trait is unknown
+        self.log_evidence = np.zeros((len(self.names), 3))
+        for i, name in enumerate(self.names):
+            if people[name]["trait"] is not None:
+                self.log_evidence[i] = np.log([
+                    PROBS["trait"][g][people[name]["trait"]] for g in range(3)
+                ])
+
+    def __len__(self):
+        return len(self.names)
+
+    def order(self):
+        """
+        Return the people's indices with every parent before their children.
+        """
+        order = []
+        placed = np.zeros(len(self), dtype=bool)
+        for i in range(len(self)):
+            stack = [i]
+            while stack:
+                j = stack[-1]
+                if placed[j]:
+                    stack.pop()
+                    continue
+                pending = [
+                    parent for parent in (self.mothers[j], self.fathers[j])
+                    if parent >= 0 and not placed[parent]
+                ]
+                if pending:
+                    stack.extend(pending)
+                else:
+                    placed[j] = True
+                    order.append(j)
+                    stack.pop()
+        return order
+
+    def sample(self, count, rng):
+        """
+        Return `count` rows of genes drawn from the model without the
+        trait evidence, drawing parents' genes before their children's.
+        """
+        genes = np.zeros((count, len(self)), dtype=np.intp)
+        for i in self.order():
+            if self.mothers[i] < 0:
+                p = np.broadcast_to(self.prior, (count, 3))
+            else:
+                mothers = genes[:, self.mothers[i]]
+                fathers = genes[:, self.fathers[i]]
+                p = self.inheritance[:, mothers, fathers].T
+            genes[:, i] = choose(p, rng)
+        return genes
+
+    def log_factors(self, genes, people):
+        """
+        Return, for each row of `genes`, the log of the product of the
+        factors of `people`: their gene's prior or inheritance
+        probability, times the probability of their known trait.
+        """
+        people = np.asarray(people)
+        founders = people[self.mothers[people] < 0]
+        children = people[self.mothers[people] >= 0]
+        return (
+            np.log(self.prior[genes[:, founders]]).sum(axis=1)
+            + np.log(self.inheritance[
+                genes[:, children],
+                genes[:, self.mothers[children]],
+                genes[:, self.fathers[children]],
+            ]).sum(axis=1)
+            + self.log_evidence[people, genes[:, people]].sum(axis=1)
+        )
+
+    def traits(self, genes):
+        """
+        Return, for each row of `genes`, every person's probability of
+        having the trait: their known trait, or its probability given
+        their gene.
+        """
+        traits = self.has_trait[genes]
+        for i, name in enumerate(self.names):
+            if self.people[name]["trait"] is not None:
+                traits[:, i] = float(self.people[name]["trait"])
+        return traits
+
+    def table(self, genes, traits, errors=False):
+        """
+        Return a probabilities table, in the form `main` prints, from an
+        array of gene probabilities and a vector of trait probabilities,
+        or if `errors` is true, of their standard errors.
+        """
+        return {
+            name: {
+                "gene": {g: float(genes[i, g]) for g in (2, 1, 0)},
+                "trait": {
+                    True: float(traits[i]),
+                    False: float(traits[i] if errors else 1 - traits[i]),
+                },
+            }
+            for i, name in enumerate(self.names)
+        }
+
+
+def likelihood_weighting(people, chains=CHAINS, seed=None):
+    """
+    Generate running estimates of every person's gene and trait
+    distributions by likelihood weighting, drawing `chains` samples at
+    a time.
+
+    Each sample draws genes from the prior, parents before children, and
+    is weighted by the probability of the known traits given those genes.
+    Each estimate is a dictionary holding the number of "samples" so far,
+    the "probabilities" table, the "errors" table of standard errors and
+    the number of "effective_samples". With many known traits a few
+    samples carry nearly all the weight, the effective samples stay few
+    and the errors are themselves unreliable; `gibbs` suits such
+    pedigrees better, and `weighting_probabilities` falls back to it.
+    """
+    model = Pedigree(people)
+    rng = np.random.default_rng(seed)
+    n = len(model)
+
+    # Sums over the samples of the weight w and its square, and of w * x
+    # and w ** 2 * x for every gene indicator and trait probability x,
+    # plus w ** 2 * x ** 2 for traits; all scaled by exp(-shift) so the
+    # largest weight seen is 1
+    shift = -np.inf
+    weight = weight2 = 0.0
+    genes_w = np.zeros((n, 3))
+    genes_w2 = np.zeros((n, 3))
+    traits_w = np.zeros(n)
+    traits_w2 = np.zeros(n)
+    traits_w2x = np.zeros(n)
+
+    samples = 0
+    while True:
+        genes = model.sample(chains, rng)
+        log_weights = model.log_evidence[np.arange(n), genes].sum(axis=1)
+        top = log_weights.max()
+        if top > shift:
+            scale = np.exp(shift - top)
+            weight *= scale
+            genes_w *= scale
+            traits_w *= scale
+            weight2 *= scale ** 2
+            genes_w2 *= scale ** 2
+            traits_w2 *= scale ** 2
+            traits_w2x *= scale ** 2
+            shift = top
+
+        w = np.exp(log_weights - shift)
+        one_hot = np.eye(3)[genes]
+        traits = model.traits(genes)
+        weight += w.sum()
+        weight2 += w @ w
+        genes_w += np.einsum("s,sij->ij", w, one_hot)
+        genes_w2 += np.einsum("s,sij->ij", w * w, one_hot)
+        traits_w += w @ traits
+        traits_w2 += (w * w) @ traits
+        traits_w2x += (w * w) @ (traits * traits)
+        samples += chains
+
+        # Standard errors of the ratio estimates, by the delta method
+        genes_mean = genes_w / weight
+        traits_mean = traits_w / weight
+        genes_variance = genes_w2 - 2 * genes_mean * genes_w2 + genes_mean ** 2 * weight2
+        traits_variance = traits_w2x - 2 * traits_mean * traits_w2 + traits_mean ** 2 * weight2
+        yield {
+            "samples": samples,
+            "probabilities": model.table(genes_mean, traits_mean),
+            "errors": model.table(
+                np.sqrt(np.maximum(genes_variance, 0)) / weight,
+                np.sqrt(np.maximum(traits_variance, 0)) / weight,
+                errors=True,
+            ),
+            "effective_samples": weight ** 2 / weight2,
+        }
+
+
+def gibbs(people, chains=CHAINS, seed=None, burn_in=BURN_IN):
+    """
+    Generate running estimates of every person's gene and trait
+    distributions by blocked Gibbs sampling with `chains` independent
+    chains, one estimate per sweep after the first `burn_in`.
+
+    Genes pass from parent to child with little chance of mutation, so
+    changing one person's gene alone is rarely likely and single-site
+    updates mix slowly; instead each person is paired with a parent or
+    child and each pair's genes are drawn jointly from their conditional
+    distribution. Standard errors come from the spread of the chains'
+    own averages. Estimates have the same form as those of
+    `likelihood_weighting`.
+    """
+    model = Pedigree(people)
+    rng = np.random.default_rng(seed)
+    n = len(model)
+
+    # Pair each person with a parent, or failing that a child, not yet
+    # in a block; a block's genes affect its own and its children's factors
+    blocks = []
+    blocked = np.zeros(n, dtype=bool)
+    for i in range(n):
+        if blocked[i]:
+            continue
+        relatives = [model.mothers[i], model.fathers[i], *model.children[i]]
+        partner = next((j for j in relatives if j >= 0 and not blocked[j]), None)
+        block = [i] if partner is None else [i, partner]
+        blocked[block] = True
+        affected = sorted(set(block).union(*(model.children[j] for j in block)))
+        states = np.array(list(itertools.product(range(3), repeat=len(block))))
+        blocks.append((block, affected, states))
+
+    # Start every chain from a draw of the genes ignoring the evidence
+    genes = model.sample(chains, rng)
+
+    genes_sum = np.zeros((chains, n, 3))
+    traits_sum = np.zeros((chains, n))
+    sweeps = 0
+    for sweep in itertools.count(1):
+        for block, affected, states in blocks:
+            log_p = np.empty((chains, len(states)))
+            for s, state in enumerate(states):
+                genes[:, block] = state
+                log_p[:, s] = model.log_factors(genes, affected)
+            p = np.exp(log_p - log_p.max(axis=1, keepdims=True))
+            genes[:, block] = states[choose(p, rng)]
+
+        if sweep <= burn_in:
+            continue
+        sweeps += 1
+        genes_sum += np.eye(3)[genes]
+        traits_sum += model.traits(genes)
+
+        genes_means = genes_sum / sweeps
+        traits_means = traits_sum / sweeps
+        yield {
+            "samples": sweeps * chains,
+            "probabilities": model.table(
+                genes_means.mean(axis=0), traits_means.mean(axis=0)
+            ),
+            "errors": model.table(
+                genes_means.std(axis=0, ddof=1) / np.sqrt(chains),
+                traits_means.std(axis=0, ddof=1) / np.sqrt(chains),
+                errors=True,
+            ),
+        }
+
+
+def choose(p, rng):
+    """
+    Return one index per row of the unnormalized probabilities `p`,
+    drawn with probability proportional to the row's entries.
+    """
+    cumulative = np.cumsum(p, axis=1)
+    draws = rng.random(len(p)) * cumulative[:, -1]
+    return np.minimum((cumulative < draws[:, None]).sum(axis=1), p.shape[1] - 1)
+
+
+def sampled_estimate(estimates, tolerance=TOLERANCE, max_samples=MAX_SAMPLES):
+    """
+    Return the first of the running `estimates` whose standard errors are
+    all below `tolerance`, or the estimate after `max_samples` samples.
+
+    Estimates with "effective_samples" are only accepted once there are
+    MIN_EFFECTIVE_SAMPLES of them, and are given up on early once that
+    many are out of reach within `max_samples`, assuming they keep
+    growing in proportion to the samples.
+    """
+    for estimate in estimates:
+        largest = max(
+            error
+            for person in estimate["errors"].values()
+            for field in person.values()
+            for error in field.values()
+        )
+        effective = estimate.get("effective_samples", np.inf)
+        if largest < tolerance and effective >= MIN_EFFECTIVE_SAMPLES:
+            return estimate
+        if effective * max_samples / estimate["samples"] < MIN_EFFECTIVE_SAMPLES:
+            return estimate
+        if estimate["samples"] >= max_samples:
+            return estimate
+
+
+def weighting_probabilities(people):
+    """
+    Estimate every person's gene and trait distributions by likelihood
+    weighting, to within TOLERANCE, or by blocked Gibbs sampling if the
+    weights collapse onto too few samples to trust.
+    """
+    estimate = sampled_estimate(likelihood_weighting(people))
+    if estimate["effective_samples"] < MIN_EFFECTIVE_SAMPLES:
+        print(
+            f"Only {estimate['effective_samples']:.0f} effective samples "
+            f"in {estimate['samples']}, using Gibbs sampling instead",
+            file=sys.stderr,
+        )
+        return gibbs_probabilities(people)
+    return estimate["probabilities"]
+
+
+def gibbs_probabilities(people):
+    """
+    Estimate every person's gene and trait distributions by blocked
+    Gibbs sampling, to within TOLERANCE.
+    """
+    return sampled_estimate(gibbs(people))["probabilities"]
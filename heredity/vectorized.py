@@ -0,0 +1,83 @@
+import numpy as np
+
+from heredity import PROBS
+
+# Number of gene assignments evaluated together
+BATCH = 1 << 16
+
+
+def vectorized_probabilities(people, batch=BATCH):
+    """
+    Compute every person's gene and trait distributions by enumerating
+    every gene assignment, like `enumerate_probabilities`, but with the
+    assignments encoded as rows of an integer array and evaluated `batch`
+    at a time with NumPy.
+
+    An assignment's joint probability is a product of lookups into tables
+    built once from PROBS, and the per-person totals are accumulated with
+    scatter-adds. Unknown traits are not enumerated: summing over both
+    values of a trait multiplies the joint probability by 1, so the
+    chance of the trait is instead added up from each assignment's gene.
+    """
+    names = list(people)
+    n = len(names)
+    index = {name: i for i, name in enumerate(names)}
+    founders = [i for i, name in enumerate(names) if people[name]["father"] is None]
+    children = [i for i, name in enumerate(names) if people[name]["father"] is not None]
+    mothers = [index[people[names[i]]["mother"]] for i in children]
+    fathers = [index[people[names[i]]["father"]] for i in children]
+
+    prior = np.array([PROBS["gene"][g] for g in range(3)])
+    inheritance = inheritance_table()
+    has_trait = np.array([PROBS["trait"][g][True] for g in range(3)])
+
+    # evidence[i, g] is the probability of person i's known trait given g
+    # copies of the gene, or 1 if their trait is unknown
+    evidence = np.ones((n, 3))
+    for i, name in enumerate(names):
+        if people[name]["trait"] is not None:
+            evidence[i] = [PROBS["trait"][g][people[name]["trait"]] for g in range(3)]
+
+    powers = 3 ** np.arange(n, dtype=np.int64)
+    offsets = 3 * np.arange(n)
+    genes_total = np.zeros(3 * n)
+    trait_total = np.zeros(n)
+    for start in range(0, 3 ** n, batch):
+        codes = np.arange(start, min(start + batch, 3 ** n), dtype=np.int64)
+        genes = codes[:, None] // powers % 3
+
+        p = prior[genes[:, founders]].prod(axis=1)
+        p *= inheritance[genes[:, children], genes[:, mothers], genes[:, fathers]].prod(axis=1)
+        p *= evidence[np.arange(n), genes].prod(axis=1)
+
+        genes_total += np.bincount(
+            (genes + offsets).ravel(), weights=np.repeat(p, n), minlength=3 * n
+        )
+        trait_total += p @ has_trait[genes]
+
+    genes_total = genes_total.reshape(n, 3)
+    total = genes_total.sum(axis=1)
+    probabilities = dict()
+    for i, name in enumerate(names):
+        gene = {g: genes_total[i, g] / total[i] for g in (2, 1, 0)}
+        if people[name]["trait"] is None:
+            p = trait_total[i] / total[i]
+        else:
+            p = float(people[name]["trait"])
+        probabilities[name] = {"gene": gene, "trait": {True: p, False: 1 - p}}
+    return probabilities
+
+
+def inheritance_table():
+    """
+    Return the array whose entry [g, mother, father] is the probability
+    that a child has g copies of the gene given their parents' copies.
+    """
+    passes = np.array([PROBS["mutation"], 0.5, 1 - PROBS["mutation"]])
+    from_mother = passes[:, None]
+    from_father = passes[None, :]
+    return np.stack([
+        (1 - from_mother) * (1 - from_father),
+        from_mother * (1 - from_father) + from_father * (1 - from_mother),
+        from_mother * from_father,
+    ])
@@ -0,0 +1,130 @@
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from linkgraph import LinkGraph
+
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Name of the link cache written into a crawled directory
+CACHE = ".links.json"
+
+# Below this many changed pages, parsing in-process beats starting a pool
+PARALLEL_THRESHOLD = 256
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python crawler.py corpus")
+    corpus = crawl(sys.argv[1])
+    links = sum(len(links) for links in corpus.values())
+    print(f"Crawled {len(corpus)} pages with {links} links")
+
+
+def crawl(directory, workers=None):
+    """
+    Parse a directory of HTML pages and check for links to other pages.
+    Return a dictionary where each key is a page, and values are
+    a set of all other pages in the corpus that are linked to by the page.
+
+    Pages are parsed on a pool of `workers` processes, and the links found
+    are cached in the directory keyed by each file's name, modification
+    time and size, so a rerun only parses pages that changed.
+    """
+    pages = parse_pages(directory, workers)
+
+    # Only include links to other pages in the corpus
+    return {
+        filename: {link for link in links if link in pages and link != filename}
+        for filename, links in pages.items()
+    }
+
+
+def crawl_graph(directory, workers=None):
+    """
+    Crawl `directory` like `crawl`, but return an integer-indexed LinkGraph
+    built straight from the edge list, without materializing a set of
+    links per page.
+    """
+    pages = parse_pages(directory, workers)
+    names = sorted(pages)
+    index = {name: i for i, name in enumerate(names)}
+    sources = []
+    targets = []
+    for i, name in enumerate(names):
+        for link in set(pages[name]):
+            j = index.get(link)
+            if j is not None and j != i:
+                sources.append(i)
+                targets.append(j)
+    return LinkGraph(names, sources, targets)
+
+
+def parse_pages(directory, workers=None):
+    """
+    Return a dictionary mapping each HTML file in `directory` to the list
+    of links it contains, reusing cached links for unchanged files.
+    """
+    cache_path = os.path.join(directory, CACHE)
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    entries = {}
+    stale = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".html"):
+            continue
+        info = entry.stat()
+        key = [info.st_mtime_ns, info.st_size]
+        cached = cache.get(entry.name)
+        if cached is not None and cached[:2] == key:
+            entries[entry.name] = cached
+        else:
+            entries[entry.name] = key
+            stale.append(entry.name)
+
+    paths = [os.path.join(directory, filename) for filename in stale]
+    if len(paths) < PARALLEL_THRESHOLD or workers == 1:
+        parsed = [parse(path) for path in paths]
+    else:
+        chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count())))
+        with ProcessPoolExecutor(workers) as pool:
+            parsed = list(pool.map(parse, paths, chunksize=chunksize))
+    for filename, links in zip(stale, parsed):
+        entries[filename] = entries[filename] + [links]
+
+    # Rewrite the cache if any page was parsed or removed
+    if stale or len(entries) != len(cache):
+        try:
+            write_cache(cache_path, entries)
+        except OSError:
+            pass
+
+    return {filename: entry[2] for filename, entry in entries.items()}
+
+
+def parse(path):
+    """
+    Return the distinct links found in the HTML file at `path`.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return sorted(set(LINK.findall(f.read())))
+
+
+def write_cache(path, entries):
+    """
+    Atomically replace the link cache at `path` with `entries`.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+    os.replace(temporary, path)
+
+
+if __name__ == "__main__":
+    main()
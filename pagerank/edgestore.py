@@ -0,0 +1,218 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from crawler import parse
+from pagerank import DAMPING
+from power import MAX_ITERATIONS, TOLERANCE
+
+# Number of edges read from disk at a time
+BLOCK = 1 << 22
+
+# Number of pages parsed per batch when crawling into a store
+CRAWL_BATCH = 4096
+
+
+class EdgeStore():
+    """
+    Link graph kept on disk as a directory of NumPy arrays, for graphs
+    whose edges do not fit in memory.
+
+    Edge `e` is a link from page `sources[e]` to page `targets[e]`, and
+    edges are sorted by target, so each block of edges adds to one
+    contiguous range of the new rank vector. Both arrays are memory-mapped;
+    only `out_degree` and rank vectors, one number per page, are held in
+    memory. Page names are read from `pages.txt` only when asked for.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.sources = np.load(os.path.join(directory, "sources.npy"), mmap_mode="r")
+        self.targets = np.load(os.path.join(directory, "targets.npy"), mmap_mode="r")
+        self.out_degree = np.load(os.path.join(directory, "out_degree.npy"))
+        self.dangling = self.out_degree == 0
+
+    @classmethod
+    def build(cls, directory, pages, chunks, block=BLOCK):
+        """
+        Writes a store for the list of page names `pages` to `directory`
+        and returns it. `chunks` yields (sources, targets) arrays of page
+        indices, one piece of the edge list at a time; links from a page
+        to itself are dropped.
+
+        Edges are spooled to a scratch file, then counting-sorted by
+        target in two passes over it, so memory use is bounded by the
+        number of pages and `block` rather than the number of edges.
+        """
+        os.makedirs(directory, exist_ok=True)
+        n = len(pages)
+        dtype = np.int32 if n < 2 ** 31 else np.int64
+        with open(os.path.join(directory, "pages.txt"), "w", encoding="utf-8") as f:
+            for page in pages:
+                f.write(f"{page}\n")
+
+        # Spool the edges and count the links from and to each page
+        out_degree = np.zeros(n, dtype=np.int64)
+        in_degree = np.zeros(n, dtype=np.int64)
+        scratch = os.path.join(directory, "edges.tmp")
+        with open(scratch, "wb") as f:
+            for sources, targets in chunks:
+                sources = np.asarray(sources, dtype=dtype)
+                targets = np.asarray(targets, dtype=dtype)
+                keep = sources != targets
+                edges = np.column_stack((sources[keep], targets[keep]))
+                out_degree += np.bincount(edges[:, 0], minlength=n)
+                in_degree += np.bincount(edges[:, 1], minlength=n)
+                edges.tofile(f)
+        m = int(out_degree.sum())
+
+        # Place each edge after those already placed for its target
+        fill = np.concatenate(([0], np.cumsum(in_degree)[:-1]))
+        sorted_sources = np.lib.format.open_memmap(
+            os.path.join(directory, "sources.npy"), "w+", dtype, (m,)
+        )
+        sorted_targets = np.lib.format.open_memmap(
+            os.path.join(directory, "targets.npy"), "w+", dtype, (m,)
+        )
+        if m:
+            spooled = np.memmap(scratch, dtype=dtype, mode="r", shape=(m, 2))
+            for start in range(0, m, block):
+                edges = spooled[start:start + block]
+                edges = edges[np.argsort(edges[:, 1], kind="stable")]
+                targets, first, counts = np.unique(
+                    edges[:, 1], return_index=True, return_counts=True
+                )
+                rank = np.arange(len(edges)) - np.repeat(first, counts)
+                positions = np.repeat(fill[targets], counts) + rank
+                sorted_sources[positions] = edges[:, 0]
+                sorted_targets[positions] = edges[:, 1]
+                fill[targets] += counts
+            del spooled
+        sorted_sources.flush()
+        sorted_targets.flush()
+        del sorted_sources, sorted_targets
+        os.remove(scratch)
+
+        np.save(os.path.join(directory, "out_degree.npy"), out_degree)
+        return cls(directory)
+
+    @classmethod
+    def from_crawl(cls, directory, corpus, workers=None):
+        """
+        Crawls the HTML pages in `corpus` into a store at `directory`,
+        parsing CRAWL_BATCH pages at a time so only one batch of links is
+        in memory at once.
+        """
+        pages = sorted(
+            entry.name for entry in os.scandir(corpus) if entry.name.endswith(".html")
+        )
+        index = {page: i for i, page in enumerate(pages)}
+
+        def chunks(pool):
+            for first in range(0, len(pages), CRAWL_BATCH):
+                batch = pages[first:first + CRAWL_BATCH]
+                paths = [os.path.join(corpus, page) for page in batch]
+                if pool:
+                    chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count())))
+                    parsed = pool.map(parse, paths, chunksize=chunksize)
+                else:
+                    parsed = map(parse, paths)
+                sources = []
+                targets = []
+                for i, links in enumerate(parsed, start=first):
+                    for link in links:
+                        j = index.get(link)
+                        if j is not None:
+                            sources.append(i)
+                            targets.append(j)
+                yield sources, targets
+
+        if workers == 1:
+            return cls.build(directory, pages, chunks(None))
+        with ProcessPoolExecutor(workers) as pool:
+            return cls.build(directory, pages, chunks(pool))
+
+    def __len__(self):
+        return len(self.out_degree)
+
+    def pages(self):
+        """
+        Returns the list of page names, in index order.
+        """
+        with open(os.path.join(self.directory, "pages.txt"), encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def step(self, ranks, damping, block=BLOCK):
+        """
+        Applies one PageRank update to the vector `ranks`, streaming the
+        edges from disk `block` at a time, and returns the result.
+        """
+        n = len(self)
+        share = np.divide(ranks, self.out_degree, out=np.zeros(n), where=~self.dangling)
+        dangling = ranks[self.dangling].sum() / n
+        new_ranks = np.full(n, (1 - damping) / n + damping * dangling)
+        for start in range(0, len(self.targets), block):
+            sources = self.sources[start:start + block]
+            targets = self.targets[start:start + block]
+            low, high = targets[0], targets[-1] + 1
+            new_ranks[low:high] += damping * np.bincount(
+                targets - low, weights=share[sources], minlength=high - low
+            )
+        return new_ranks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="edgestore.py",
+        description="Build on-disk edge stores and rank them out of core."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    builder = commands.add_parser("build", help="crawl a corpus into a store")
+    builder.add_argument("corpus")
+    builder.add_argument("store")
+    builder.add_argument("--workers", type=int)
+
+    ranker = commands.add_parser("rank", help="rank the pages of a store")
+    ranker.add_argument("store")
+    ranker.add_argument("--top", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        store = EdgeStore.from_crawl(args.store, args.corpus, args.workers)
+        print(f"Stored {len(store)} pages with {len(store.targets)} links")
+        return
+
+    if not os.path.isdir(args.store):
+        sys.exit(f"No edge store at {args.store}")
+    store = EdgeStore(args.store)
+    ranks = stream_pagerank(store, DAMPING)
+    pages = store.pages()
+    print("PageRank Results from Out-of-Core Power Iteration")
+    for i in np.argsort(-ranks, kind="stable")[:args.top]:
+        print(f"  {pages[i]}: {ranks[i]:.4f}")
+
+
+def stream_pagerank(store, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS, block=BLOCK):
+    """
+    Return the PageRank vector of the EdgeStore `store`, by power
+    iteration with each sweep streaming the edges from disk, until the
+    L1 change is below `tolerance`.
+    """
+    n = len(store)
+    ranks = np.full(n, 1 / n)
+    for _ in range(max_iterations):
+        new_ranks = store.step(ranks, damping_factor, block)
+        change = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if change < tolerance:
+            break
+    return ranks
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import numpy as np
+from scipy import sparse
+
+
+class LinkGraph():
+    """
+    Integer-indexed link graph of a corpus.
+
+    Page `i` is `pages[i]`. `matrix` is the sparse column-stochastic link
+    matrix: entry (j, i) is 1 / (number of links on page i) whenever page i
+    links to page j. Columns of pages without links are empty and those
+    pages are flagged in `dangling`; following the PageRank model, a surfer
+    on such a page jumps to any page with equal probability.
+
+    The links of page `i` are also available in CSR form, as
+    `links[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, pages, sources, targets):
+        self.pages = list(pages)
+        self.index = {page: i for i, page in enumerate(self.pages)}
+
+        n = len(self.pages)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        self.out_degree = np.bincount(sources, minlength=n)
+        self.dangling = self.out_degree == 0
+        self.matrix = sparse.csr_matrix(
+            (1 / self.out_degree[sources], (targets, sources)), shape=(n, n)
+        )
+        self.offsets = np.concatenate(([0], np.cumsum(self.out_degree)))
+        self.links = targets[np.argsort(sources, kind="stable")]
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Builds a graph from a corpus as returned by `crawl`, a dictionary
+        mapping each page to the set of pages it links to.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        sources = []
+        targets = []
+        for page in pages:
+            for link in corpus[page]:
+                sources.append(index[page])
+                targets.append(index[link])
+        return cls(pages, sources, targets)
+
+    def patch(self, changes):
+        """
+        Returns a new graph with the links of some pages replaced, along
+        with an array giving each old page's index in the new graph
+        (or -1 if it was removed).
+
+        `changes` maps a page to the set of pages it now links to, or to
+        None if the page was removed. Pages not yet in the graph are added
+        after the existing ones; links to pages in neither are ignored.
+        """
+        removed = {page for page, links in changes.items() if links is None}
+        added = sorted(
+            page for page, links in changes.items()
+            if links is not None and page not in self.index
+        )
+        gone = np.zeros(len(self.pages), dtype=bool)
+        gone[[self.index[page] for page in removed if page in self.index]] = True
+        pages = [page for page, g in zip(self.pages, gone.tolist()) if not g] + added
+        index = {page: i for i, page in enumerate(pages)} if added or removed else self.index
+
+        # Surviving pages keep their order, so their new index is the
+        # number of surviving pages before them
+        mapping = np.cumsum(~gone) - 1
+        mapping[gone] = -1
+        old = [self.index[page] for page in changes if page in self.index]
+
+        # Keep the links of unchanged pages whose target still exists
+        sources = np.repeat(np.arange(len(self.pages)), self.out_degree)
+        keep = ~np.isin(sources, old)
+        sources = mapping[sources[keep]]
+        targets = mapping[self.links[keep]]
+        keep = targets >= 0
+        sources, targets = [sources[keep]], [targets[keep]]
+
+        for page, links in changes.items():
+            if links is None:
+                continue
+            linked = [index[link] for link in links if link in index and link != page]
+            sources.append(np.full(len(linked), index[page], dtype=np.int64))
+            targets.append(np.array(linked, dtype=np.int64))
+        return LinkGraph(pages, np.concatenate(sources), np.concatenate(targets)), mapping
+
+    def __len__(self):
+        return len(self.pages)
+
+    def step(self, ranks, damping):
+        """
+        Applies one PageRank update to `ranks`, either one vector or a
+        matrix with one column per rank vector, and returns the result.
+        """
+        n = len(self.pages)
+        dangling = self.dangling @ ranks / n
+        return (1 - damping) / n + damping * (self.matrix @ ranks + dangling)
+
+    def to_dict(self, ranks):
+        """
+        Returns a dictionary mapping each page to its entry in `ranks`.
+        """
+        return {page: float(rank) for page, rank in zip(self.pages, ranks)}
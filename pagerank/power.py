@@ -0,0 +1,175 @@
+import sys
+
+import numpy as np
+
+from linkgraph import LinkGraph
+from pagerank import DAMPING, crawl
+
+# Iteration stops once the L1 norm of the change in ranks falls below this
+TOLERANCE = 1e-10
+
+# Upper bound on the number of iterations
+MAX_ITERATIONS = 1000
+
+# Number of personalized rank vectors iterated together; larger blocks
+# share each pass over the links more widely but fall out of cache
+BLOCK = 16
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python power.py corpus")
+    corpus = crawl(sys.argv[1])
+    ranks = iterate_pagerank(corpus, DAMPING)
+    print("PageRank Results from Sparse Power Iteration")
+    for page in sorted(ranks):
+        print(f"  {page}: {ranks[page]:.4f}")
+
+
+def iterate_pagerank(corpus, damping_factor):
+    """
+    Return PageRank values for each page by power iteration over a
+    sparse link matrix, built once from the corpus.
+
+    Return a dictionary where keys are page names, and values are
+    their estimated PageRank value (a value between 0 and 1). All
+    PageRank values should sum to 1.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    return graph.to_dict(power_iteration(graph, damping_factor))
+
+
+def power_iteration(graph, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS, start=None):
+    """
+    Return the PageRank vector of `graph`, starting from `start`, or the
+    uniform distribution if it is None, and iterating until the L1
+    change is below `tolerance`.
+    """
+    n = len(graph)
+    ranks = np.full(n, 1 / n) if start is None else start
+    for _ in range(max_iterations):
+        new_ranks = graph.step(ranks, damping_factor)
+        change = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if change < tolerance:
+            break
+    return ranks
+
+
+def personalized_pagerank(graph, teleport, damping_factor, tolerance=TOLERANCE,
+                          max_iterations=MAX_ITERATIONS):
+    """
+    Return one personalized PageRank vector per column of `teleport`, an
+    N x K matrix whose columns are the distributions the surfer jumps to.
+
+    Columns are iterated BLOCK at a time, so each pass over the link
+    matrix is one sparse-matrix times dense-matrix product rather than
+    one traversal per column. A column stops being updated once its L1
+    change is below `tolerance`.
+    """
+    teleport = np.asarray(teleport, dtype=float)
+    n, k = teleport.shape
+    matrix = damping_factor * graph.matrix
+    dangling = damping_factor / n * graph.dangling
+
+    ranks = np.empty((n, k))
+    for first in range(0, k, BLOCK):
+        columns = np.arange(first, min(first + BLOCK, k))
+        jump = (1 - damping_factor) * teleport[:, columns]
+        block = teleport[:, columns]
+        for _ in range(max_iterations):
+            new_block = matrix @ block
+            new_block += dangling @ block
+            new_block += jump
+
+            # Reuse the old block to hold the change
+            block -= new_block
+            np.abs(block, out=block)
+            done = block.sum(axis=0) < tolerance
+            block = new_block
+            if done.any():
+                ranks[:, columns[done]] = block[:, done]
+                columns, block, jump = columns[~done], block[:, ~done], jump[:, ~done]
+                if not len(columns):
+                    break
+        ranks[:, columns] = block
+    return ranks
+
+
+def seed_teleport(graph, seed_sets):
+    """
+    Return the teleport matrix for `personalized_pagerank` with one
+    column per set of seed pages, spread evenly over that set.
+    """
+    teleport = np.zeros((len(graph), len(seed_sets)))
+    for column, seeds in enumerate(seed_sets):
+        rows = [graph.index[page] for page in seeds]
+        teleport[rows, column] = 1 / len(rows)
+    return teleport
+
+
+def update_pagerank(graph, ranks, changes, damping_factor, push=False,
+                    tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Return the graph and PageRank vector after the pages in `changes`
+    changed, re-converging from the previous vector `ranks` rather than
+    from the uniform distribution.
+
+    `changes` maps each changed page to the set of pages it now links
+    to, or to None if it was removed. New pages start at 1 / N. If `push`
+    is true, a localized push pass first settles the residual around the
+    changed pages, so the final power iterations have little left to do.
+    """
+    new_graph, mapping = graph.patch(changes)
+    n = len(new_graph)
+    start = np.full(n, 1 / n)
+    kept = mapping >= 0
+    start[mapping[kept]] = ranks[kept]
+    start /= start.sum()
+
+    if push:
+        start = push_residual(new_graph, start, damping_factor, tolerance / n)
+    new_ranks = power_iteration(
+        new_graph, damping_factor, tolerance, max_iterations, start
+    )
+    return new_graph, new_ranks
+
+
+def push_residual(graph, ranks, damping_factor, epsilon):
+    """
+    Return `ranks` improved by pushing residual mass from the pages
+    whose residual exceeds `epsilon`.
+
+    The residual of a page is how much one PageRank update would change
+    its rank. Pushing settles a page's residual into its rank and passes
+    `damping_factor` of it on, split evenly among the pages it links to.
+    Each round pushes from every page over `epsilon` at once, so only
+    the links of those pages are read and the work stays near the pages
+    that changed.
+    """
+    n = len(graph)
+    ranks = ranks.copy()
+    residual = graph.step(ranks, damping_factor) - ranks
+    while True:
+        active = np.flatnonzero(np.abs(residual) > epsilon)
+        if not len(active):
+            return ranks
+        pushed = residual[active]
+        ranks[active] += pushed
+        residual[active] = 0.0
+
+        # Gather the links of the active pages from the CSR arrays
+        degree = graph.out_degree[active]
+        total = degree.sum()
+        first = np.repeat(graph.offsets[active] - np.cumsum(degree) + degree, degree)
+        targets = graph.links[first + np.arange(total)]
+        shares = np.repeat(damping_factor * pushed / np.maximum(degree, 1), degree)
+        residual += np.bincount(targets, weights=shares, minlength=n)
+
+        # A page without links passes its mass to every page equally
+        residual += damping_factor * pushed[degree == 0].sum() / n
+
+
+if __name__ == "__main__":
+    main()
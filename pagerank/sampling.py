@@ -0,0 +1,177 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from linkgraph import LinkGraph
+from pagerank import DAMPING, SAMPLES, crawl
+
+# Number of random surfers advanced together on each step
+WALKERS = 1024
+
+# Steps each surfer takes before its visits are counted; surfers start on
+# uniformly random pages, and after k steps only about DAMPING ** k of
+# that starting bias remains
+BURN_IN = 50
+
+# Largest number of samples handed to a worker process as one task
+SHARD = 10000000
+
+# Graph shared by the tasks a worker process runs
+graph = None
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="sampling.py")
+    parser.add_argument("corpus")
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to spread the samples over")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    corpus = crawl(args.corpus)
+    if args.workers > 1:
+        link_graph = LinkGraph.from_corpus(corpus)
+        counts, stats = parallel_walk_counts(
+            link_graph, DAMPING, args.samples, args.workers, args.seed
+        )
+        ranks = link_graph.to_dict(counts / args.samples)
+        for worker in stats:
+            print(f"Worker {worker['pid']}: {worker['samples']} samples "
+                  f"in {worker['seconds']:.2f}s ({worker['rate']:.0f}/s)")
+    else:
+        ranks = sample_pagerank(corpus, DAMPING, args.samples, seed=args.seed)
+
+    print(f"PageRank Results from Batched Sampling (n = {args.samples})")
+    for page in sorted(ranks):
+        print(f"  {page}: {ranks[page]:.4f}")
+
+
+def sample_pagerank(corpus, damping_factor, n, walkers=WALKERS, seed=None,
+                    burn_in=BURN_IN):
+    """
+    Return PageRank values for each page by sampling `n` pages with
+    many random surfers moving in lockstep.
+
+    Return a dictionary where keys are page names, and values are
+    their estimated PageRank value (a value between 0 and 1). All
+    PageRank values should sum to 1.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    rng = np.random.default_rng(seed)
+    counts = walk_counts(graph, damping_factor, n, walkers, rng, burn_in)
+    return graph.to_dict(counts / n)
+
+
+def walk_counts(graph, damping_factor, n, walkers, rng, burn_in=BURN_IN):
+    """
+    Return how many of `n` samples landed on each page of `graph`, taken
+    by up to `walkers` surfers that each start on a page chosen at random
+    and take `burn_in` uncounted steps first.
+
+    Each step draws one random number per surfer to decide whether it
+    follows a link and another to pick the page it moves to; a link is
+    chosen by indexing into the page's slice of the CSR link array, so
+    no per-page distribution is ever materialized. Only visit counts are
+    kept, so memory stays proportional to the number of pages.
+    """
+    pages = len(graph)
+    counts = np.zeros(pages, dtype=np.int64)
+    walkers = max(1, min(walkers, n))
+    current = rng.integers(pages, size=walkers)
+    for _ in range(burn_in):
+        current = step(graph, current, damping_factor, rng)
+
+    remaining = n
+    while remaining > 0:
+        # The last step may only need some of the surfers
+        if remaining < len(current):
+            current = current[:remaining]
+        counts += np.bincount(current, minlength=pages)
+        remaining -= len(current)
+        if remaining > 0:
+            current = step(graph, current, damping_factor, rng)
+    return counts
+
+
+def parallel_walk_counts(link_graph, damping_factor, n, workers=None, seed=None,
+                         walkers=WALKERS, burn_in=BURN_IN):
+    """
+    Return the visit counts of `n` samples spread over a pool of `workers`
+    processes, along with per-worker throughput statistics.
+
+    The samples are split into shards of at most SHARD samples, at least
+    one per worker, and each shard walks with its own random stream
+    spawned from `seed`, so shards are independent and the result is
+    reproducible for a given seed and number of workers. Counts from
+    every shard are simply summed.
+    """
+    workers = workers or os.cpu_count()
+    shards = max(workers, -(-n // SHARD))
+    sizes = [n // shards + (i < n % shards) for i in range(shards)]
+    streams = np.random.SeedSequence(seed).spawn(shards)
+
+    counts = np.zeros(len(link_graph), dtype=np.int64)
+    stats = {}
+    with ProcessPoolExecutor(workers, initializer=share_graph,
+                             initargs=(link_graph,)) as pool:
+        tasks = [
+            pool.submit(sample_shard, size, damping_factor, walkers, burn_in, stream)
+            for size, stream in zip(sizes, streams) if size > 0
+        ]
+        for task in tasks:
+            shard_counts, pid, seconds = task.result()
+            counts += shard_counts
+            worker = stats.setdefault(pid, {"pid": pid, "samples": 0, "seconds": 0.0})
+            worker["samples"] += int(shard_counts.sum())
+            worker["seconds"] += seconds
+
+    for worker in stats.values():
+        worker["rate"] = worker["samples"] / worker["seconds"] if worker["seconds"] else 0.0
+    return counts, list(stats.values())
+
+
+def share_graph(link_graph):
+    """
+    Keeps `link_graph` for the shards this worker process runs.
+    """
+    global graph
+    graph = link_graph
+
+
+def sample_shard(n, damping_factor, walkers, burn_in, stream):
+    """
+    Return the visit counts of one shard of `n` samples, the id of the
+    process that took them and how many seconds that took.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(stream)
+    counts = walk_counts(graph, damping_factor, n, walkers, rng, burn_in)
+    return counts, os.getpid(), time.perf_counter() - start
+
+
+def step(graph, current, damping_factor, rng):
+    """
+    Move every surfer in `current` to its next page.
+
+    With probability `damping_factor` a surfer follows a random link from
+    its page; otherwise, or from a page without links, it jumps to any
+    page at random.
+    """
+    size = len(current)
+    degree = graph.out_degree[current]
+    follow = (rng.random(size) < damping_factor) & (degree > 0)
+    jump = rng.integers(len(graph), size=size)
+
+    # Only look up links for the surfers following one, as a corpus
+    # without any links has none to index
+    offset = (rng.random(size) * degree)[follow].astype(np.int64)
+    jump[follow] = graph.links[graph.offsets[current[follow]] + offset]
+    return jump
+
+
+if __name__ == "__main__":
+    main()
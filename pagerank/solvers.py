@@ -0,0 +1,198 @@
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve_triangular
+
+from crawler import crawl_graph
+from pagerank import DAMPING
+from power import MAX_ITERATIONS, TOLERANCE
+
+# Norms the change between iterates can be measured in
+NORMS = {
+    "l1": lambda x: np.abs(x).sum(),
+    "l2": lambda x: np.sqrt(x @ x),
+    "linf": lambda x: np.abs(x).max(),
+}
+
+# Iterations between extrapolation steps of the accelerated solvers
+EXTRAPOLATION_PERIOD = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="solvers.py",
+        description="Compare PageRank solvers and trace their convergence."
+    )
+    parser.add_argument("corpus")
+    parser.add_argument("--method", choices=list(METHODS), default="jacobi")
+    parser.add_argument("--norm", choices=list(NORMS), default="l1")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--trace", action="store_true",
+                        help="print the residual and time of every iteration")
+    args = parser.parse_args()
+
+    graph = crawl_graph(args.corpus)
+    ranks, trace = solve(graph, DAMPING, args.method, args.norm, args.tolerance)
+    if args.trace:
+        print(f"{'iteration':>9} {'residual':>12} {'seconds':>10}")
+        for entry in trace:
+            print(f"{entry['iteration']:>9} {entry['residual']:>12.3e} "
+                  f"{entry['seconds']:>10.4f}")
+    print(f"{args.method}: {len(trace)} iterations, "
+          f"residual {trace[-1]['residual']:.3e}, {trace[-1]['seconds']:.3f}s")
+    if len(graph) <= 100:
+        for page, rank in sorted(graph.to_dict(ranks).items()):
+            print(f"  {page}: {rank:.4f}")
+
+
+def solve(graph, damping_factor, method="jacobi", norm="l1",
+          tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Return the PageRank vector of `graph` computed by `method`, and a
+    trace with one dictionary per iteration giving its number, its
+    residual and the seconds elapsed since the solver started.
+
+    The residual is the change between successive iterates, measured in
+    `norm`; iteration stops once it falls below `tolerance`.
+    """
+    measure = NORMS[norm]
+    iterate = METHODS[method](graph, damping_factor)
+    ranks = np.full(len(graph), 1 / len(graph))
+    trace = []
+    start = time.perf_counter()
+    for i in range(1, max_iterations + 1):
+        new_ranks = iterate(ranks)
+        residual = measure(new_ranks - ranks)
+        ranks = new_ranks
+        trace.append({
+            "iteration": i,
+            "residual": float(residual),
+            "seconds": time.perf_counter() - start,
+        })
+        if residual < tolerance:
+            break
+    return ranks / ranks.sum(), trace
+
+
+def jacobi(graph, damping_factor):
+    """
+    Return a function applying one power iteration, the Jacobi method
+    for the PageRank linear system.
+    """
+    return lambda ranks: graph.step(ranks, damping_factor)
+
+
+def gauss_seidel(graph, damping_factor):
+    """
+    Return a function applying one Gauss-Seidel sweep, which uses each
+    page's new rank as soon as it is known.
+
+    The sweep is a sparse triangular solve with the lower part of the
+    link matrix. The jumps from pages without links reach every page, so
+    they are taken from the previous iterate instead. Unlike a power
+    iteration, a sweep does not keep the ranks summing to 1, and letting
+    the total drift slows convergence, so each result is rescaled.
+    """
+    n = len(graph)
+    lower = (
+        sparse.identity(n, format="csr")
+        - damping_factor * sparse.tril(graph.matrix, 0, format="csr")
+    )
+    upper = damping_factor * sparse.triu(graph.matrix, 1, format="csr")
+
+    def sweep(ranks):
+        b = (1 - damping_factor) / n + upper @ ranks
+        b += damping_factor * (graph.dangling @ ranks) / n
+        ranks = spsolve_triangular(lower, b, lower=True)
+        return ranks / ranks.sum()
+
+    return sweep
+
+
+def aitken(graph, damping_factor, period=EXTRAPOLATION_PERIOD):
+    """
+    Return a function applying power iterations, replacing every
+    `period`th iterate by its componentwise Aitken delta-squared
+    extrapolation from the last three iterates.
+    """
+    step = jacobi(graph, damping_factor)
+    history = []
+
+    def iterate(ranks):
+        history.append(ranks)
+        del history[:-2]
+        ranks = step(ranks)
+        if len(history) == 2 and (iterate.count + 1) % period == 0:
+            x0, x1, x2 = history[0], history[1], ranks
+            denominator = x2 - 2 * x1 + x0
+            safe = np.abs(denominator) > 1e-15
+            extrapolated = x2.copy()
+            extrapolated[safe] -= (x2 - x1)[safe] ** 2 / denominator[safe]
+            ranks = accepted(step, extrapolated, x1, ranks)
+        iterate.count += 1
+        return ranks
+
+    iterate.count = 0
+    return iterate
+
+
+def quadratic(graph, damping_factor, period=EXTRAPOLATION_PERIOD):
+    """
+    Return a function applying power iterations, replacing every
+    `period`th iterate by a quadratic extrapolation from the last four,
+    which cancels the components along the second and third eigenvectors
+    of the PageRank matrix (Kamvar et al., 2003).
+    """
+    step = jacobi(graph, damping_factor)
+    history = []
+
+    def iterate(ranks):
+        history.append(ranks)
+        del history[:-3]
+        ranks = step(ranks)
+        if len(history) == 3 and (iterate.count + 1) % period == 0:
+            x0, x1, x2 = history
+            y = np.column_stack((x1 - x0, x2 - x0))
+            gamma = np.linalg.lstsq(y, -(ranks - x0), rcond=None)[0]
+            g1, g2, g3 = gamma[0], gamma[1], 1.0
+            extrapolated = (g1 + g2 + g3) * x1 + (g2 + g3) * x2 + g3 * ranks
+            ranks = accepted(step, extrapolated, x2, ranks)
+        iterate.count += 1
+        return ranks
+
+    iterate.count = 0
+    return iterate
+
+
+def accepted(step, extrapolated, previous, ranks):
+    """
+    Return the next iterate after `ranks`, which followed `previous`,
+    given an `extrapolated` guess at the solution.
+
+    Extrapolation can overshoot, so the guess is clipped to a
+    distribution and kept, advanced by one `step`, only if that step
+    changes it by less than `ranks` changed from `previous`.
+    """
+    extrapolated = np.maximum(extrapolated, 0)
+    total = extrapolated.sum()
+    if not np.isfinite(total) or total <= 0:
+        return ranks
+    extrapolated /= total
+    advanced = step(extrapolated)
+    if np.abs(advanced - extrapolated).sum() < np.abs(ranks - previous).sum():
+        return advanced
+    return ranks
+
+
+METHODS = {
+    "jacobi": jacobi,
+    "gauss-seidel": gauss_seidel,
+    "aitken": aitken,
+    "quadratic": quadratic,
+}
+
+
+if __name__ == "__main__":
+    main()